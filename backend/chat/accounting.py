@@ -0,0 +1,93 @@
+import json
+from decimal import Decimal
+
+from django.conf import settings
+
+from .tokens import MESSAGE_OVERHEAD, count_tokens
+
+
+def estimate_prompt_tokens(messages, tools=None, model=None):
+    """Prompt tokens of a request, for streamed replies that come without ``usage``."""
+    tokens = sum(count_tokens(msg.get("content") or "", model) + MESSAGE_OVERHEAD for msg in messages)
+    for msg in messages:
+        if msg.get("tool_calls"):
+            tokens += count_tokens(json.dumps(msg["tool_calls"]), model)
+    if tools:
+        tokens += count_tokens(json.dumps(tools), model)
+    return tokens
+
+
+def estimate_completion_tokens(message, model=None):
+    tokens = count_tokens(message.get("content") or "", model)
+    for call in message.get("tool_calls") or []:
+        tokens += count_tokens(call["function"]["name"] + call["function"]["arguments"], model)
+    return tokens
+
+
+def cost_of(model, prompt_tokens, completion_tokens):
+    """USD cost from OPENAI_PRICES (per 1K tokens), or None for an unpriced model."""
+    prices = settings.OPENAI_PRICES.get(model)
+    if prices is None:
+        return None
+    cost = (
+        Decimal(str(prices["prompt"])) * prompt_tokens
+        + Decimal(str(prices["completion"])) * completion_tokens
+    ) / 1000
+    return cost.quantize(Decimal("0.000001"))
+
+
+class TurnStats:
+    """
+    Usage and timings gathered over one chat turn, stored on the turn's
+    assistant ChatMessage.
+    """
+    def __init__(self):
+        self.path = "llm"
+        self.model = ""
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_seconds = 0.0
+        self.lookup_seconds = 0.0
+        self.lookup_models = set()
+        self.used_tools = False
+
+    def add_llm_call(self, model, prompt_tokens, completion_tokens, seconds):
+        self.model = model
+        self.llm_calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.llm_seconds += seconds
+
+    def add_lookups(self, lookup_specs, seconds):
+        self.lookup_seconds += seconds
+        for spec in lookup_specs:
+            if isinstance(spec, dict) and spec.get("model"):
+                self.lookup_models.add(str(spec["model"]))
+
+    def add_tool_calls(self, tool_calls, seconds):
+        self.used_tools = True
+        specs = []
+        for call in tool_calls:
+            try:
+                args = json.loads(call["function"].get("arguments") or "{}")
+            except json.JSONDecodeError:
+                continue
+            if isinstance(args, dict):
+                specs.append(args.get("lookup_spec", args))
+        self.add_lookups(specs, seconds)
+
+    def message_fields(self):
+        """Keyword arguments for the assistant ChatMessage."""
+        return {
+            "answer_path": self.path,
+            "llm_model": self.model,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": cost_of(self.model, self.prompt_tokens, self.completion_tokens) if self.llm_calls else None,
+            "llm_latency_ms": round(self.llm_seconds * 1000),
+            "lookup_latency_ms": round(self.lookup_seconds * 1000),
+            "used_tools": self.used_tools,
+            "lookup_models": ",".join(sorted(self.lookup_models)),
+        }
@@ -1,16 +1,39 @@
 from django.contrib import admin
+from django.db.models.functions import Substr
+from core.paginator import EstimatedCountPaginator
 from .models import ChatMessage, ChatSession
 
+# Characters of a message shown in the changelist
+PREVIEW_LENGTH = 80
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'get_user', 'content', 'created_at') 
+    list_display = ('id', 'get_user', 'content_preview', 'role', 'created_at')
+    list_select_related = ('session__user',)
+    list_filter = ('created_at',)
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Rows carry a short prefix instead of the full, possibly huge, text
+        queryset = super().get_queryset(request).defer('content')
+        return queryset.annotate(preview=Substr('content', 1, PREVIEW_LENGTH))
 
     def get_user(self, obj):
         return obj.session.user if obj.session and obj.session.user else "Anonymous"
     get_user.short_description = 'User'
 
+    def content_preview(self, obj):
+        preview = obj.preview or ""
+        return preview + "…" if len(preview) == PREVIEW_LENGTH else preview
+    content_preview.short_description = 'Content'
+
 
 @admin.register(ChatSession)
 class ChatSessionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'session_id', 'title', 'created_at')
-
+    list_select_related = ('user',)
+    list_filter = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
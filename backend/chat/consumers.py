@@ -1,17 +1,38 @@
 import json
+import asyncio
+import logging
+from collections import deque
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger("chat.consumers")
+
+
+def entries_since(history, marker):
+    """History entries appended after ``marker``, the last entry before a turn."""
+    entries = []
+    for entry in reversed(history):
+        if entry is marker:
+            break
+        entries.append(entry)
+    return entries[::-1]
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         from .models import ChatSession
+        from .openai_utils import HISTORY_LIMIT, load_session_state
         self.session_id = self.scope['url_route']['kwargs'].get('session_id')  # Check for session_id in the URL
-        user = self.scope["user"] if self.scope["user"].is_authenticated else None
+        self.user = self.scope["user"] if self.scope["user"].is_authenticated else None
 
         if self.session_id:
-            # Try to fetch the existing session
-            session = await sync_to_async(ChatSession.objects.filter(session_id=self.session_id).first)()
-            if session:
+            # Load the existing session and its history window once for the whole connection
+            self.session, self.history = await load_session_state(self.session_id)
+            if self.session:
+                await self.join_session_group()
+                self.start_worker()
                 await self.accept()
                 await self.send(json.dumps({
                     "type": "session_connected",
@@ -22,8 +43,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.close()  # Close connection if the session is invalid
         else:
             # Create a new session
-            session = await sync_to_async(ChatSession.objects.create)(user=user, title="New Session")
-            self.session_id = str(session.session_id)
+            # Anonymous sessions belong to the browser session, when the socket carries one
+            browser_session = self.scope.get("session")
+            key = "" if self.user or browser_session is None else browser_session.session_key or ""
+            self.session = await sync_to_async(ChatSession.objects.create)(
+                user=self.user, anonymous_key=key, title="New Session"
+            )
+            self.history = deque(maxlen=HISTORY_LIMIT)
+            self.session_id = str(self.session.session_id)
+            await self.join_session_group()
+            self.start_worker()
             await self.accept()
             await self.send(json.dumps({
                 "type": "session_created",
@@ -31,35 +60,155 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 "message": "New session created successfully."
             }))
 
+    async def join_session_group(self):
+        # Every socket on this session, in any worker, receives its replies
+        self.group_name = f"chat_session_{self.session.session_id.hex}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+    def start_worker(self):
+        # Questions are answered one at a time, in arrival order, by a task
+        # owned by this socket; receive() only queues them
+        self.waiting = deque()
+        self.wakeup = asyncio.Event()
+        self.current = None
+        self.worker = asyncio.ensure_future(self.work())
+
+    async def work(self):
+        while True:
+            if not self.waiting:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            user_query, stream = self.waiting.popleft()
+            self.current = asyncio.ensure_future(self.run_turn(user_query, stream))
+            # wait() rather than await, so cancelling the turn doesn't stop the worker
+            await asyncio.wait([self.current])
+            turn, self.current = self.current, None
+            if turn.cancelled():
+                await self.broadcast({"type": "chat_cancelled"})
+            elif turn.exception() is not None:
+                logger.error("Chat turn failed for session %s", self.session_id, exc_info=turn.exception())
+
+    async def send_busy(self, reason, query, message):
+        await self.send(json.dumps({
+            "type": "busy",
+            "reason": reason,
+            "query": query,
+            "message": message
+        }))
+
+    async def enqueue(self, user_query, stream):
+        """
+        Queues a question, applying CHAT_QUEUE_OVERFLOW when the socket is
+        busy and CHAT_QUEUE_SIZE questions are already waiting.
+        """
+        if self.current is not None and len(self.waiting) >= settings.CHAT_QUEUE_SIZE:
+            overflow = settings.CHAT_QUEUE_OVERFLOW
+            if overflow == "replace":
+                # The newest question wins; work nobody will read stops now
+                self.waiting.clear()
+                self.current.cancel()
+                await self.send_busy("replaced", user_query, "Stopped the previous question to answer this one.")
+            elif overflow == "drop_oldest" and self.waiting:
+                dropped, _ = self.waiting.popleft()
+                await self.send_busy("dropped", dropped, f"Too many questions at once, skipped: {dropped}")
+            else:
+                await self.send_busy("rejected", user_query, "Still working on your earlier questions, please ask again shortly.")
+                return
+        self.waiting.append((user_query, stream))
+        self.wakeup.set()
+
     async def disconnect(self, close_code):
-        # Handle disconnection (optional)
-        pass
+        from .message_writer import message_writer
+        if getattr(self, "worker", None):
+            # Nobody will read these replies: stop pending LLM calls and lookups
+            self.waiting.clear()
+            tasks = [task for task in (self.worker, self.current) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+        if getattr(self, "group_name", None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        # Don't leave this connection's messages sitting in the write-behind buffer
+        await message_writer.flush()
+
+    async def broadcast(self, frame, skip_self=False):
+        """Sends a frame to every socket of the session through the channel layer."""
+        await self.channel_layer.group_send(self.group_name, {
+            "type": "chat.frame",
+            "frame": frame,
+            "skip": self.channel_name if skip_self else None,
+        })
+
+    async def chat_frame(self, event):
+        if event.get("skip") != self.channel_name:
+            await self.send(json.dumps(event["frame"]))
+
+    async def chat_turn(self, event):
+        """Keeps this socket's history window in step with turns answered on other sockets."""
+        from .openai_utils import history_entry
+        if event["sender"] == self.channel_name:
+            return
+        for entry in event["entries"]:
+            self.history.append(history_entry(
+                entry["role"], entry["content"], entry["tokens"], parse_datetime(entry["created_at"])
+            ))
 
     async def receive(self, text_data):
-        from .models import ChatSession
-        from .openai_utils import process_conversation
         data = json.loads(text_data)
-        user = self.scope["user"] if self.scope["user"].is_authenticated else None
 
         user_query = data.get("query")
         session_id = data.get("session_id")
+        stream = data.get("stream", False)
 
         if not session_id:
             await self.send(json.dumps({"error": "Session ID is required."}))
             return
 
-        # Validate session before processing
-        session_exists = await sync_to_async(ChatSession.objects.filter(session_id=session_id).exists)()
-        if not session_exists:
+        # The session was validated in connect(); only accept messages for it
+        if str(session_id) != self.session_id:
             await self.send(json.dumps({"error": "Invalid session ID."}))
             return
 
-        # Process the user query
-        response = await process_conversation(user_query, session_id, user=user)
+        await self.enqueue(user_query, stream)
 
-        # Send the AI's response
-        await self.send(json.dumps({
-            "type": "chat_response",
-            "reply": response.get("reply")
-        }))
+    async def run_turn(self, user_query, stream):
+        from .openai_utils import process_session_conversation
+        last_entry = self.history[-1] if self.history else None
+
+        # Other sockets on the session show the question too
+        await self.broadcast({"type": "chat_message", "role": "user", "content": user_query}, skip_self=True)
+
+        if stream:
+            # Forward tokens as they are generated, then close the reply
+            async def send_delta(delta):
+                await self.broadcast({
+                    "type": "chat_delta",
+                    "delta": delta
+                })
+
+            response = await process_session_conversation(
+                user_query, self.session, self.history, user=self.user, on_delta=send_delta
+            )
+            await self.broadcast({
+                "type": "chat_done",
+                "reply": response.get("reply")
+            })
+        else:
+            # Process the user query
+            response = await process_session_conversation(user_query, self.session, self.history, user=self.user)
+
+            # Send the AI's response
+            await self.broadcast({
+                "type": "chat_response",
+                "reply": response.get("reply")
+            })
 
+        await self.channel_layer.group_send(self.group_name, {
+            "type": "chat.turn",
+            "sender": self.channel_name,
+            "entries": [
+                dict(entry, created_at=entry["created_at"].isoformat())
+                for entry in entries_since(self.history, last_entry)
+            ],
+        })
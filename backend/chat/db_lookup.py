@@ -1,17 +1,27 @@
 import json
+import logging
 from datetime import datetime
 from channels.db import database_sync_to_async
-from django.core.exceptions import FieldError, ValidationError
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum
 
-from orders.models import Order, OrderItem
+from orders.models import DailyOrderStats, DailyProductSales, Order, OrderItem
 from customers.models import Customer
 from products.models import Product
 
+from .lookup_cache import lookup_cache
+from .metrics import record_lookup, span
+from .search import SEARCH_RANK, SEARCH_TARGETS, apply_search
+from .singleflight import SingleFlight
+
 MODEL_MAPPING = {
     "Order": Order,
     "Customer": Customer,
     "Product": Product,
-    "OrderItem": OrderItem
+    "OrderItem": OrderItem,
+    "DailyOrderStats": DailyOrderStats,
+    "DailyProductSales": DailyProductSales
 }
 
 OPERATOR_MAPPING = {
@@ -23,6 +33,27 @@ OPERATOR_MAPPING = {
     "=": "exact"
 }
 
+AGGREGATE_MAPPING = {
+    "count": Count,
+    "sum": Sum,
+    "avg": Avg,
+    "min": Min,
+    "max": Max
+}
+
+logger = logging.getLogger("chat.lookup")
+
+# Identical lookups running at the same time share one query
+lookup_flight = SingleFlight("lookup")
+
+# Rows fetched per round trip while streaming a result set
+CHUNK_SIZE = 200
+
+# Computed field usable in aggregates: price * quantity of an OrderItem.
+# Reachable from other models through their relation prefix,
+# e.g. "items__line_total" on Order or "orderitem__line_total" on Product.
+LINE_TOTAL = "line_total"
+
 def convert_filter_key(key):
     for operator, lookup in OPERATOR_MAPPING.items():
         if operator in key:
@@ -39,38 +70,195 @@ def parse_date(value):
                 continue
     return value
 
-@database_sync_to_async
-def get_filtered_queryset(ModelClass, filters, fields):
-    print(f"Running DB Query on Model: {ModelClass.__name__}")
-    print(f"Filters: {filters}")
-    print(f"Fields: {fields}")
+class AggregateError(ValueError):
+    """An 'aggregate' entry that can't be computed for the lookup's model."""
+
+def resolve_aggregate_field(ModelClass, field):
+    if field == LINE_TOTAL or field.endswith(f"__{LINE_TOTAL}"):
+        prefix = field[:-len(LINE_TOTAL)]
+        # Follow the relation prefix from the lookup's model; it has to end on OrderItem
+        target = ModelClass
+        for name in prefix.split("__")[:-1]:
+            try:
+                target = target._meta.get_field(name).related_model
+            except FieldDoesNotExist:
+                target = None
+            if target is None:
+                break
+        if target is not OrderItem:
+            raise AggregateError(
+                f"'{field}' on {ModelClass.__name__} doesn't lead to an order item; use 'line_total' on "
+                f"OrderItem, 'items__{LINE_TOTAL}' on Order or 'orderitem__{LINE_TOTAL}' on Product"
+            )
+        return ExpressionWrapper(
+            F(f"{prefix}price") * F(f"{prefix}quantity"),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+    return field
+
+def build_aggregates(ModelClass, aggregate):
+    """
+    Turns {"alias": {"op": "sum", "field": "price", "distinct": false}} into
+    {"alias": Sum("price")}. Raises AggregateError on unknown operators and
+    on 'line_total' paths that don't reach an OrderItem from ``ModelClass``.
+    """
+    expressions = {}
+    for alias, spec in aggregate.items():
+        op = str(spec.get("op", "")).lower()
+        if op not in AGGREGATE_MAPPING:
+            raise AggregateError(f"Unknown aggregate operator '{op}' for '{alias}'")
+        field = spec.get("field") or "id"
+        extra = {"distinct": True} if spec.get("distinct") and op == "count" else {}
+        expressions[alias] = AGGREGATE_MAPPING[op](resolve_aggregate_field(ModelClass, field), **extra)
+    return expressions
 
+def get_row_limit(model_name, requested=None):
+    """
+    The per-model row cap from settings, lowered to ``requested`` when the
+    lookup asks for fewer rows.
+    """
+    limits = settings.LOOKUP_ROW_LIMITS
+    cap = limits.get(model_name, limits["default"])
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return cap
+    return max(1, min(requested, cap))
+
+def read_rows(queryset, limit):
+    """
+    Streams at most ``limit`` rows and reports whether more were available.
+    The total is a bounded COUNT so it stays cheap on large tables.
+    """
+    rows = []
+    for row in queryset[:limit + 1].iterator(chunk_size=min(CHUNK_SIZE, limit + 1)):
+        rows.append(row)
+    truncated = len(rows) > limit
+    if not truncated:
+        return {"rows": rows, "truncated": False, "total": len(rows)}
+
+    count_cap = settings.LOOKUP_COUNT_CAP
+    total = queryset.order_by()[:count_cap].count()
+    payload = {"rows": rows[:limit], "truncated": True, "total": total}
+    if total >= count_cap:
+        # Only a lower bound: counting further would mean scanning the table
+        payload["total_capped"] = True
+    return payload
+
+def filtered_queryset(ModelClass, filters, fields, aggregate=None, group_by=None, order_by=None, limit=None,
+                      search=None):
+    logger.debug(
+        "lookup model=%s filters=%s search=%s fields=%s aggregate=%s group_by=%s order_by=%s limit=%s",
+        ModelClass.__name__, filters, search, fields, aggregate, group_by, order_by, limit
+    )
     for key, value in filters.items():
         if 'date' in key or 'created_at' in key:
             filters[key] = parse_date(value)
 
     try:
         queryset = ModelClass.objects.filter(**filters)
-        result = list(queryset.values(*fields)) if fields else list(queryset.values())
-        print(f"DB Query Result: {result}")
+        default_order = ["-pk"]
+        if search:
+            queryset, ranked = apply_search(ModelClass.__name__, queryset, search)
+            if ranked:
+                # Newest first among rows sharing a match, e.g. one customer's orders
+                default_order = [SEARCH_RANK, "-pk"]
+        if aggregate:
+            expressions = build_aggregates(ModelClass, aggregate)
+            if group_by:
+                # One row per group, computed by the database
+                grouped = queryset.values(*group_by).annotate(**expressions)
+                result = read_rows(grouped.order_by(*(order_by or group_by)), limit)
+            else:
+                result = {"rows": [queryset.aggregate(**expressions)], "truncated": False, "total": 1}
+        else:
+            rows = queryset.values(*fields) if fields else queryset.values()
+            # Best search match, otherwise newest, first unless asked otherwise,
+            # so truncation keeps the most relevant rows
+            result = read_rows(rows.order_by(*(order_by or default_order)), limit)
         return result
-    except (FieldError, ValidationError) as e:
-        print(f"Validation Error: {e}")
+    except AggregateError as e:
+        logger.info("Invalid aggregate on %s: %s", ModelClass.__name__, e)
+        return {"error": f"Invalid aggregate: {e}"}
+    except (FieldError, ValidationError, ValueError) as e:
+        logger.info("Invalid lookup on %s: %s", ModelClass.__name__, e)
         return {"error": f"Invalid filter: {str(e)}"}
     except Exception as e:
-        print(f"Unexpected Error: {e}")
+        logger.exception("Lookup on %s failed", ModelClass.__name__)
         return {"error": f"Unexpected error: {str(e)}"}
 
+# Lookups run in the thread pool instead of the single shared sync thread,
+# so the lookups of one assistant turn can hit the database at the same time
+get_filtered_queryset = database_sync_to_async(filtered_queryset, thread_sensitive=False)
+
+def is_name_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
 async def perform_db_lookup(lookup_spec: dict):
     model_name = lookup_spec.get("model")
-    filters = lookup_spec.get("filters", {})
-    fields = lookup_spec.get("fields", [])
+    filters = lookup_spec.get("filters") or {}
+    fields = lookup_spec.get("fields") or []
+    aggregate = lookup_spec.get("aggregate") or {}
+    group_by = lookup_spec.get("group_by") or []
+    order_by = lookup_spec.get("order_by") or []
+    search = lookup_spec.get("search") or None
 
     if not model_name or model_name not in MODEL_MAPPING:
+        record_lookup(model_name, "invalid")
         return {"error": "Invalid model name"}
+    if not isinstance(filters, dict) or not all(isinstance(k, str) for k in filters):
+        return {"error": "Invalid filters: expected {\"field__lookup\": value}"}
+    if isinstance(fields, str):
+        fields = [fields]
+    if not is_name_list(fields):
+        return {"error": "Invalid fields: expected a list of field names"}
+    if not isinstance(aggregate, dict) or not all(isinstance(v, dict) for v in aggregate.values()):
+        return {"error": "Invalid aggregate: expected {\"alias\": {\"op\": ..., \"field\": ...}}"}
+    if search is not None and not isinstance(search, str):
+        return {"error": "Invalid search: expected a string"}
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    if not is_name_list(group_by) or not is_name_list(order_by):
+        return {"error": "Invalid group_by/order_by: expected a list of field names"}
+    limit = get_row_limit(model_name, lookup_spec.get("limit"))
 
     ModelClass = MODEL_MAPPING[model_name]
     converted_filters = {convert_filter_key(k): v for k, v in filters.items()}
-    results = await get_filtered_queryset(ModelClass, converted_filters, fields)
+
+    # Serve repeated lookups from the cache while none of the models they read changed
+    cache_key = lookup_cache.make_key(
+        model_name, converted_filters, fields, aggregate, group_by, order_by, limit, search
+    )
+    aggregate_fields = [spec.get("field") or "id" for spec in aggregate.values()]
+    order_fields = [field.lstrip("-") for field in order_by]
+    search_fields = [SEARCH_TARGETS[model_name][1]] if search and model_name in SEARCH_TARGETS else []
+    labels = lookup_cache.related_labels(
+        ModelClass, converted_filters, fields + group_by + aggregate_fields + order_fields + search_fields
+    )
+    cached = await lookup_cache.get(cache_key, labels)
+    if cached is not None:
+        record_lookup(model_name, "cache_hit")
+        return cached
+
+    async def run_lookup():
+        # Read versions before querying so a concurrent write can't be masked
+        versions = await lookup_cache.get_versions(labels)
+        with span("lookup", model=model_name) as timing:
+            results = await get_filtered_queryset(
+                ModelClass, converted_filters, fields, aggregate, group_by, order_by, limit, search
+            )
+            timing["rows"] = len(results.get("rows", []))
+        if "error" in results:
+            record_lookup(model_name, "error")
+        else:
+            record_lookup(model_name, "query", results)
+            await lookup_cache.set(cache_key, versions, results)
+        return results
+
+    results, shared = await lookup_flight.do(cache_key, run_lookup)
+    if shared:
+        record_lookup(model_name, "coalesced")
     return results
 
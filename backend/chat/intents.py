@@ -0,0 +1,133 @@
+import re
+
+from .db_lookup import parse_date
+
+# Statuses as users say them, mapped to Order.status values
+STATUS_WORDS = {
+    "pending": "pending",
+    "delayed": "pending",
+    "processing": "processing",
+    "in progress": "processing",
+    "completed": "completed",
+    "delivered": "completed",
+    "cancelled": "cancelled",
+    "canceled": "cancelled",
+}
+STATUS = "(?P<status>" + "|".join(STATUS_WORDS) + ")"
+ORDERS = "(?:orders|jobs)"
+LEAD = r"(?:(?:show|list|get|find|give)(?: me)? |what are )?(?:all )?(?:the |my )?"
+DATE = r"(?P<date>\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4}|\d{1,2}/\d{1,2}/\d{4})"
+
+# Words that make "orders for <x>" a time range rather than a customer name
+TIME_WORDS = {"today", "yesterday", "last", "this", "next", "week", "month", "year", "day", "days"}
+
+ORDER_FIELDS = ["id", "customer__name", "status", "created_at"]
+
+
+def normalize(query):
+    return " ".join((query or "").lower().strip().rstrip("?.!").split())
+
+
+def order_lines(rows):
+    return "\n".join(
+        f"- Order #{row['id']} for {row['customer__name']} ({row['status']}, {str(row['created_at'])[:10]})"
+        for row in rows
+    )
+
+
+def describe(description, count):
+    """Fills the ``{orders}`` placeholder of ``description`` with the right number."""
+    return description.format(orders="order" if count == 1 else "orders")
+
+
+def render_orders(description):
+    def render(result):
+        rows = result["rows"]
+        if not rows:
+            return "No records found for your query."
+        total = result["total"]
+        # A capped total only says there are at least that many
+        amount = f"at least {total}" if result.get("total_capped") else total
+        header = f"Found {amount} {describe(description, total)}"
+        if result.get("truncated"):
+            header += f", showing the latest {len(rows)}"
+        return f"{header}:\n{order_lines(rows)}"
+    return render
+
+
+def render_count(description):
+    def render(result):
+        count = result["rows"][0]["count"] if result["rows"] else 0
+        return f"There {'is' if count == 1 else 'are'} {count} {describe(description, count)}."
+    return render
+
+
+def render_stock(result):
+    rows = result["rows"]
+    if not rows:
+        return "No records found for your query."
+    lines = "\n".join(f"- {row['name']}: {row['stock_quantity']} in stock" for row in rows)
+    return f"Stock levels:\n{lines}"
+
+
+def count_status_orders(match):
+    status = STATUS_WORDS[match["status"]]
+    spec = {"model": "Order", "filters": {"status": status}, "aggregate": {"count": {"op": "count", "field": "id"}}}
+    return spec, render_count(f"{status} {{orders}}")
+
+
+def list_status_orders(match):
+    status = STATUS_WORDS[match["status"]]
+    spec = {"model": "Order", "filters": {"status": status}, "fields": ORDER_FIELDS}
+    return spec, render_orders(f"{status} {{orders}}")
+
+
+def customer_orders(match):
+    name = match["name"].strip()
+    if set(name.split()) & TIME_WORDS:
+        return None
+    spec = {"model": "Order", "search": name, "fields": ORDER_FIELDS}
+    return spec, render_orders(f"{{orders}} for '{name}'")
+
+
+def product_stock(match):
+    product = match["product"].strip()
+    spec = {"model": "Product", "search": product, "fields": ["name", "stock_quantity"]}
+    return spec, render_stock
+
+
+def orders_since(match):
+    date = parse_date(match["date"])
+    spec = {"model": "Order", "filters": {"created_at__gte": date}, "fields": ORDER_FIELDS}
+    return spec, render_orders(f"{{orders}} since {date}")
+
+
+# Checked in order; the first pattern that matches and builds a spec wins
+INTENTS = [
+    ("count_status_orders", re.compile(rf"^how many {STATUS} {ORDERS}(?: are there| do we have)?$"), count_status_orders),
+    ("list_status_orders", re.compile(rf"^{LEAD}{STATUS} {ORDERS}$"), list_status_orders),
+    ("orders_since", re.compile(rf"^{LEAD}{ORDERS} (?:since|after|from) {DATE}$"), orders_since),
+    ("customer_orders", re.compile(rf"^{LEAD}{ORDERS} (?:for|of|from|by) (?P<name>[a-z][a-z .'-]*)$"), customer_orders),
+    ("customer_orders", re.compile(rf"^{LEAD}(?P<name>[a-z][a-z .-]*)'s {ORDERS}$"), customer_orders),
+    ("product_stock", re.compile(r"^(?:what is |what's |show |check )?(?:the )?stock (?:of|for) (?P<product>.+)$"), product_stock),
+    ("product_stock", re.compile(r"^how many (?P<product>.+?) (?:are |do we have )?in stock$"), product_stock),
+]
+
+
+def match_intent(query):
+    """
+    Recognizes the common query shapes without calling the LLM.
+
+    Returns ``(intent_name, lookup_spec, render)`` where ``render`` turns the
+    ``perform_db_lookup`` result into the reply text, or ``None`` when the
+    query isn't recognized and should go to the LLM.
+    """
+    text = normalize(query)
+    for name, pattern, build in INTENTS:
+        match = pattern.match(text)
+        if match:
+            built = build(match)
+            if built is not None:
+                spec, render = built
+                return name, spec, render
+    return None
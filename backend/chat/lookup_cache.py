@@ -0,0 +1,184 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+
+KEY_PREFIX = "lookup_cache:"
+
+
+class InProcessBackend:
+    """
+    LRU + TTL cache living in the worker's memory.
+    Model versions are plain counters, so invalidation is per process: a write
+    handled by one worker doesn't reach the others, which keep serving their
+    entries until the TTL expires. Use ``DjangoCacheBackend`` with several workers.
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        # Signals fire from sync worker threads while reads happen on the event loop
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_versions(self, labels):
+        with self._lock:
+            return {label: self._versions.get(label, 0) for label in labels}
+
+    def bump_version(self, label):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Stores entries in one of Django's configured caches (e.g. Redis), so every
+    worker shares the results and the invalidations.
+    TTL is passed as the cache timeout; eviction is left to the cache itself.
+    """
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    async def get(self, key):
+        return await sync_to_async(self.cache.get)(KEY_PREFIX + key)
+
+    async def set(self, key, value):
+        await sync_to_async(self.cache.set)(KEY_PREFIX + key, value, self.ttl)
+
+    async def get_versions(self, labels):
+        keys = {f"{KEY_PREFIX}version:{label}": label for label in labels}
+        found = await sync_to_async(self.cache.get_many)(list(keys))
+        return {label: found.get(key, 0) for key, label in keys.items()}
+
+    def bump_version(self, label):
+        key = f"{KEY_PREFIX}version:{label}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # First write for this model
+            self.cache.set(key, 1, None)
+
+    def clear(self):
+        pass
+
+
+class LookupCache:
+    """
+    Caches ``perform_db_lookup`` results keyed by (model, filters, fields).
+
+    Every entry remembers the version of each model it read from. A write to
+    any of those models bumps its version, which turns the entry into a miss.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name, filters, fields, aggregate=None, group_by=None, order_by=None, limit=None,
+                 search=None):
+        canonical = json.dumps(
+            {
+                "model": model_name,
+                "filters": filters,
+                "fields": list(fields),
+                "aggregate": aggregate or {},
+                "group_by": list(group_by or []),
+                "order_by": list(order_by or []),
+                "limit": limit,
+                "search": search,
+            },
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha1(canonical.encode()).hexdigest()
+
+    @staticmethod
+    def related_labels(ModelClass, filters, fields):
+        """
+        Returns the labels of every model a lookup reads from, following the
+        relations used in filter keys and field names (e.g. ``customer__name``).
+        """
+        labels = {ModelClass._meta.label}
+        for path in list(filters) + list(fields):
+            current = ModelClass
+            for part in path.split("__"):
+                try:
+                    field = current._meta.get_field(part)
+                except FieldDoesNotExist:
+                    break
+                if not field.is_relation or field.related_model is None:
+                    break
+                current = field.related_model
+                labels.add(current._meta.label)
+        return sorted(labels)
+
+    async def get(self, key, labels):
+        entry = await self.backend.get(key)
+        if entry is not None:
+            versions = await self.backend.get_versions(labels)
+            if entry["versions"] == versions:
+                self.hits += 1
+                return entry["value"]
+        self.misses += 1
+        return None
+
+    async def set(self, key, versions, value):
+        await self.backend.set(key, {"versions": versions, "value": value})
+
+    async def get_versions(self, labels):
+        return await self.backend.get_versions(labels)
+
+    def invalidate(self, ModelClass):
+        self.backend.bump_version(ModelClass._meta.label)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def build_lookup_cache():
+    ttl = settings.LOOKUP_CACHE_TTL
+    if settings.LOOKUP_CACHE_BACKEND == "django":
+        backend = DjangoCacheBackend(settings.LOOKUP_CACHE_ALIAS, ttl)
+    else:
+        backend = InProcessBackend(settings.LOOKUP_CACHE_MAX_ENTRIES, ttl)
+    return LookupCache(backend)
+
+
+lookup_cache = build_lookup_cache()
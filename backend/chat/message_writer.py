@@ -0,0 +1,156 @@
+import atexit
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils.timezone import now
+
+from .metrics import span
+from .models import ChatMessage
+
+logger = logging.getLogger("chat.persistence")
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for ChatMessage rows.
+
+    Messages are queued in arrival order and written with one ``bulk_create``
+    once ``max_batch`` rows are pending or ``flush_interval`` seconds have
+    passed since the first of them was queued. ``created_at`` is set when a
+    message is queued, so history ordering doesn't depend on flush time.
+
+    If a batch fails its rows are written one at a time. A row the database
+    rejects, or one that has failed ``max_attempts`` flushes, is logged and
+    appended to ``dead_letter_path`` so it can't hold up the rest of the queue.
+    """
+    # Errors caused by the row itself, e.g. a deleted session or a NUL byte on PostgreSQL
+    REJECTED = (DataError, IntegrityError, ValueError)
+
+    def __init__(self, max_batch, flush_interval, max_attempts=5, dead_letter_path=None):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self._pending = []
+        # The batch being written: still visible to pending_for() until it's committed
+        self._inflight = []
+        self._timer = None
+        # add() runs on event loops, flushes run in worker threads
+        self._lock = threading.Lock()
+        # Held while a batch is taken and written, so batches hit the DB in order
+        self._flush_lock = threading.Lock()
+
+    async def add(self, session, role, content, **fields):
+        message = ChatMessage(session=session, role=role, content=content, created_at=now(), **fields)
+        with self._lock:
+            self._pending.append(message)
+            size = len(self._pending)
+
+        if size >= self.max_batch:
+            await self.flush()
+        else:
+            self.schedule_flush()
+        return message
+
+    def schedule_flush(self):
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, lambda: loop.create_task(self.flush()))
+
+    def pending_for(self, session):
+        """
+        Messages of ``session`` that are queued but not yet written, oldest first.
+        """
+        with self._lock:
+            return [msg for msg in self._inflight + self._pending if msg.session_id == session.id]
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        written = await sync_to_async(self.flush_sync)()
+        if not written:
+            # The batch went back to the queue; retry it instead of waiting for the next add()
+            self.schedule_flush()
+
+    def flush_sync(self):
+        """Writes the queued messages; returns False if some had to be queued again."""
+        with self._flush_lock:
+            with self._lock:
+                self._inflight, self._pending = self._pending, []
+                batch = self._inflight
+            if not batch:
+                return True
+            retry = []
+            try:
+                # A savepoint, so a failed batch doesn't break an enclosing transaction
+                with span("persistence", messages=len(batch)), transaction.atomic():
+                    ChatMessage.objects.bulk_create(batch)
+            except Exception:
+                logger.warning("ChatMessage batch of %d failed, writing it row by row", len(batch), exc_info=True)
+                retry = self.write_rows(batch)
+            with self._lock:
+                self._pending = retry + self._pending
+                self._inflight = []
+            return not retry
+
+    def write_rows(self, batch):
+        """Writes ``batch`` one row at a time; returns the rows worth another attempt."""
+        retry = []
+        for message in batch:
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create([message])
+            except self.REJECTED as e:
+                self.dead_letter(message, e)
+            except Exception as e:
+                message._write_attempts = getattr(message, "_write_attempts", 0) + 1
+                if message._write_attempts >= self.max_attempts:
+                    self.dead_letter(message, e)
+                else:
+                    retry.append(message)
+        if retry:
+            logger.error("Keeping %d ChatMessages queued after a failed flush", len(retry))
+        return retry
+
+    def dead_letter(self, message, error):
+        record = {
+            "session_id": message.session_id,
+            "role": message.role,
+            "content": message.content,
+            "created_at": message.created_at.isoformat(),
+            "error": str(error),
+        }
+        logger.error("Dropping ChatMessage for session %s: %s", message.session_id, error)
+        if not self.dead_letter_path:
+            return
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            logger.exception("Could not write to the dead-letter file %s", self.dead_letter_path)
+
+    def drain(self):
+        """Final flush at shutdown; whatever still can't be written is dead-lettered."""
+        if self.flush_sync():
+            return
+        with self._lock:
+            rest, self._pending = self._pending, []
+        for message in rest:
+            self.dead_letter(message, "worker shut down before the message was written")
+
+
+message_writer = MessageWriter(
+    settings.CHAT_WRITE_BATCH_SIZE,
+    settings.CHAT_WRITE_FLUSH_INTERVAL,
+    max_attempts=settings.CHAT_WRITE_MAX_ATTEMPTS,
+    dead_letter_path=settings.CHAT_DEAD_LETTER_PATH
+)
+
+# Write whatever is still queued when the worker shuts down
+atexit.register(message_writer.drain)
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger("chat.timing")
+
+# Stages of a chat turn: session_load, history_load, fast_path, llm_first,
+# llm_followup, lookup, persistence
+STAGE_SECONDS = Histogram(
+    "storechat_chat_stage_seconds",
+    "Time spent in each stage of a chat turn",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+STAGE_ERRORS = Counter(
+    "storechat_chat_stage_errors_total",
+    "Stages that ended with an exception",
+    ["stage"],
+)
+TURN_SECONDS = Histogram(
+    "storechat_chat_turn_seconds",
+    "Duration of a whole chat turn by how it was answered",
+    ["path"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+LOOKUPS = Counter(
+    "storechat_lookups_total",
+    "Database lookups by model and how they were served",
+    ["model", "outcome"],
+)
+LOOKUP_ROWS = Histogram(
+    "storechat_lookup_rows",
+    "Rows returned by a database lookup",
+    ["model"],
+    buckets=(0, 1, 5, 10, 25, 50, 100, 200),
+)
+LOOKUP_BYTES = Histogram(
+    "storechat_lookup_payload_bytes",
+    "Size of a lookup result as sent to the LLM",
+    ["model"],
+    buckets=(128, 512, 1024, 4096, 16384, 65536, 262144),
+)
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Times a block into ``storechat_chat_stage_seconds{stage=...}`` and logs
+    it as one ``key=value`` line on the ``chat.timing`` logger. The yielded
+    dict can be filled with extra fields while the block runs.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield fields
+    except BaseException:
+        outcome = "error"
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            extra = " ".join(f"{key}={value}" for key, value in fields.items())
+            logger.debug(f"span stage={stage} duration_ms={elapsed * 1000:.1f} outcome={outcome} {extra}".rstrip())
+
+
+def record_lookup(model_name, outcome, result=None):
+    """Counts a lookup; results read from the database also record their size."""
+    LOOKUPS.labels(model_name or "unknown", outcome).inc()
+    if result is not None and "rows" in result:
+        LOOKUP_ROWS.labels(model_name).observe(len(result["rows"]))
+        LOOKUP_BYTES.labels(model_name).observe(len(json.dumps(result, default=str)))
+
+
+def render_metrics():
+    """
+    Returns ``(body, content_type)`` in the Prometheus text format. With
+    PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples there and
+    this merges them, so any worker can answer a scrape.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
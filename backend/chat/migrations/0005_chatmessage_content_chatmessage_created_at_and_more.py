@@ -26,7 +26,7 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='chatmessage',
             name='role',
-            field=models.CharField(choices=[('user', 'User'), ('assistant', 'Assistant')], default=django.utils.timezone.now, max_length=10),
+            field=models.CharField(choices=[('user', 'User'), ('assistant', 'Assistant')], default='user', max_length=10),
             preserve_default=False,
         ),
         migrations.AddField(
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_chat_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['-created_at', '-id'], name='chat_msg_created_idx'),
+        ),
+    ]
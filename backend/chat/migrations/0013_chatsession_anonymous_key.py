@@ -0,0 +1,22 @@
+# Generated by Django 4.1 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_chatmessage_accounting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='anonymous_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['anonymous_key', '-id'], name='chat_session_anon_id_idx'),
+        ),
+    ]
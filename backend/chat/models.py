@@ -8,12 +8,24 @@ class ChatSession(models.Model):
     Represents a chat session, which can be linked to an authenticated user or an anonymous session ID.
     """
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Django session key of the anonymous browser that created it; only that browser can list it
+    anonymous_key = models.CharField(max_length=40, blank=True, default="", editable=False)
     session_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     title = models.CharField(max_length=255, default="New Session")
+    # Condensed older turns; messages up to ``summary_until`` are only sent through it
+    summary = models.TextField(blank=True, default="")
+    summary_until = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Session list: a user's sessions, newest first, paged by id
+            models.Index(fields=['user', '-id'], name='chat_session_user_id_idx'),
+            models.Index(fields=['anonymous_key', '-id'], name='chat_session_anon_id_idx'),
+        ]
+
     def __str__(self):
         return f"Session {self.session_id} - {self.title}"
 
@@ -25,7 +37,33 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages', null = True)
     role = models.CharField(max_length=10, choices=[('user', 'User'), ('assistant', 'Assistant')])
     content = models.TextField(null = True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Prompt tokens of ``content``, counted once when the message is saved
+    token_count = models.PositiveIntegerField(null=True, blank=True)
+    # Set explicitly rather than auto_now_add so queued messages keep their send time
+    created_at = models.DateTimeField(default=now, editable=False)
+
+    # Accounting for assistant messages: how the turn was answered, what the
+    # LLM calls used and cost, and where the time went (see chat/accounting.py)
+    answer_path = models.CharField(max_length=20, blank=True, default="")
+    llm_model = models.CharField(max_length=50, blank=True, default="")
+    llm_calls = models.PositiveSmallIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    llm_latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    lookup_latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    used_tools = models.BooleanField(default=False)
+    # Comma-separated lookup_spec models queried during the turn
+    lookup_models = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            # History window and chat view: a session's messages, newest first,
+            # with id breaking ties for keyset pages on (created_at, id)
+            models.Index(fields=['session', '-created_at', '-id'], name='chat_msg_session_keyset_idx'),
+            # Admin changelist: all messages by date, and its date filter
+            models.Index(fields=['-created_at', '-id'], name='chat_msg_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.role.capitalize()} Message at {self.created_at}"
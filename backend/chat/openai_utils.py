@@ -1,21 +1,47 @@
 import os
 import json
 import openai
+import time
 import asyncio
+import logging
 import traceback
+from collections import deque
+from functools import lru_cache
 
 from asgiref.sync import sync_to_async
-from .db_lookup import perform_db_lookup
+from django.conf import settings
+from .db_lookup import MODEL_MAPPING, perform_db_lookup
+from .message_writer import message_writer
 from .models import ChatMessage, ChatSession
+from .upstream import upstream_pool
+from .tokens import count_tokens, get_encoding, select_within_budget
+from .summaries import maybe_schedule_summary
+from .singleflight import SingleFlight, payload_key
+from .intents import match_intent
+from .metrics import TURN_SECONDS, span
+from .accounting import TurnStats, estimate_completion_tokens, estimate_prompt_tokens
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-MODEL_METADATA = {
-    "Order": ["id", "customer", "status", "created_at", "requested_by"],
-    "OrderItem": ["id", "order", "product", "quantity", "price"],
-    "Customer": ["id", "name", "email", "phone", "created_at"],
-    "Product": ["id", "name", "price", "category", "description", "stock_quantity"]
-}
+# Identical ChatCompletion requests running at the same time share one upstream call
+llm_flight = SingleFlight("llm")
+
+logger = logging.getLogger("chat.turn")
+
+# Most previous messages kept as candidates for the context window.
+# Which of them are actually sent is decided by HISTORY_TOKEN_BUDGET.
+HISTORY_LIMIT = 50
+
+def build_model_metadata():
+    """
+    Field names of every model the LLM can query, read from the models' ``_meta``.
+    """
+    return {
+        name: [field.name for field in ModelClass._meta.concrete_fields]
+        for name, ModelClass in MODEL_MAPPING.items()
+    }
+
+MODEL_METADATA = build_model_metadata()
 
 FUNCTIONS = [
     {
@@ -29,7 +55,20 @@ FUNCTIONS = [
                     "description": (
                         "A lookup specification with keys: 'model', 'filters', and 'fields'. "
                         "For example: {\"model\": \"Order\", \"filters\": {\"status\": \"delivered\"}, "
-                        "\"fields\": [\"id\", \"customer__name\", \"status\", \"created_at\"]}"
+                        "\"fields\": [\"id\", \"customer__name\", \"status\", \"created_at\"]}. "
+                        "Optional keys 'aggregate' and 'group_by' compute counts and totals in the database. "
+                        "'aggregate' maps an alias to {\"op\": count|sum|avg|min|max, \"field\": <field>}; "
+                        "'line_total' (price * quantity of an order item) can be used as a field, "
+                        "e.g. 'items__line_total' on Order or 'orderitem__line_total' on Product. "
+                        "For example: {\"model\": \"OrderItem\", \"aggregate\": {\"revenue\": "
+                        "{\"op\": \"sum\", \"field\": \"line_total\"}}, \"group_by\": [\"product__name\"]}. "
+                        "Optional 'order_by' (list of fields, '-' prefix for descending) and 'limit' "
+                        "control which rows come back; the row count is capped per model. "
+                        "Optional 'search' is free text matched, typo-tolerant, against customer names "
+                        "(on Customer and Order) or product names and descriptions (on Product, OrderItem "
+                        "and DailyProductSales); matches come best first, rows of the same match newest first. "
+                        "For example: {\"model\": \"Order\", \"search\": \"jon smith\", "
+                        "\"fields\": [\"id\", \"customer__name\", \"status\"]}."
                     ),
                 }
             },
@@ -48,180 +87,404 @@ def build_system_prompt():
         f"{models_info}\n\n"
         "Important instructions:\n"
         "1. Interpret 'jobs' or 'job' as 'orders' in user queries.\n"
-        "2. If the user says 'delayed' or 'pending', interpret that as {\"status__iexact\": \"pending\"}.\n"
+        "2. If the user says 'delayed' or 'pending', interpret that as {\"status\": \"pending\"}. "
+        "Status values are lowercase: pending, processing, completed, cancelled.\n"
         "3. When the user asks about orders, default to model 'Order'.\n"
         "4. When the user asks about order items, default to model 'OrderItem'.\n"
         "5. When the user asks about customers, default to model 'Customer'.\n"
         "6. When the user asks about products, default to model 'Product'.\n"
-        "7. If the user mentions a customer name (e.g. 'John'), use a filter like "
-        "{\"customer__name__icontains\": \"john\"}.\n"
+        "7. If the user mentions a customer or product name (e.g. 'John', 'business cards'), "
+        "put it in 'search' (e.g. {\"model\": \"Order\", \"search\": \"john\"}) rather than an "
+        "'icontains' filter; search uses an index and tolerates typos.\n"
         "8. Whenever the user requests specific data, you MUST call 'run_sql_query'.\n\n"
-        "9. If the function_call result is an empty list (i.e., '[]'), respond with:"
-        "   'No records found for your query.'"
+        "9. The function_call result has 'rows', 'truncated' and 'total'. If 'rows' is empty, respond with:"
+        "   'No records found for your query.'\n"
+        "   If 'truncated' is true, only part of the matches is shown: mention the total "
+        "and that the list is partial.\n"
         "10. If the function_call result is not empty, summarize the results and provide a relevant answer."
+        "\n    Rows come newest first; use 'order_by' and 'limit' for 'latest', 'top' or 'first N' questions."
+        "\n11. For counts, totals or averages (e.g. 'how many pending orders', 'revenue per product'), "
+        "use 'aggregate' with op count/sum/avg/min/max and, for per-group answers, 'group_by' "
+        "instead of fetching rows. Revenue is the sum of 'line_total' (price * quantity) of order items.\n"
+        "12. For statistics over time, such as orders per status per day/week or top products by revenue, "
+        "query the precomputed rollups instead of Order/OrderItem: 'DailyOrderStats' (date, status, order_count) "
+        "and 'DailyProductSales' (date, product, quantity, revenue), e.g. sum 'revenue' grouped by 'product__name' "
+        "with a 'date__gte' filter.\n"
         "Use relevant fields from each model to craft the lookup. Only pick from the known fields.\n"
         "Steps:\n"
         "1) If you need to call a function to do a database lookup, do so with 'run_sql_query' and provide:\n"
         "   - model\n"
         "   - filters\n"
-        "   - fields\n\n"
-        "2) After receiving the function result, provide a final answer.\n\n"
+        "   - fields\n"
+        "   - search, aggregate, group_by, order_by and limit (optional)\n\n"
+        "   When a question needs several lookups (e.g. orders and the customer's details), "
+        "request them all in the same turn so they run together.\n"
+        "2) After receiving the function results, provide a final answer.\n\n"
         "3) If a user references a non-existent field, interpret it in the closest valid way.\n"
     )
 
-async def async_call_openai_chat(messages, functions=None, function_call="auto"):
+# Same definitions in the tools format, which allows several calls per assistant turn
+TOOLS = [{"type": "function", "function": function} for function in FUNCTIONS]
+
+# The prompt only depends on the models, so it is built once per process
+SYSTEM_PROMPT = build_system_prompt()
+
+
+def system_prompt_tokens():
+    # Estimated until the tokenizer has loaded, then counted once
+    return _system_prompt_tokens(get_encoding() is not None)
+
+
+@lru_cache(maxsize=2)
+def _system_prompt_tokens(exact):
+    return count_tokens(SYSTEM_PROMPT)
+
+
+async def async_call_openai_chat(messages, tools=None, tool_choice="auto"):
     """
-    A thin wrapper around openai.ChatCompletion.create() executed in a thread,
-    allowing us to call it from async code without blocking.
+    A thin wrapper around openai.ChatCompletion.acreate(), run on the event loop
+    through the shared upstream session and concurrency limit.
     """
-    return await asyncio.to_thread(
-        openai.ChatCompletion.create,
-        model="gpt-3.5-turbo",
-        messages=messages,
-        functions=functions,
-        function_call=function_call
+    async with upstream_pool.slot():
+        return await openai.ChatCompletion.acreate(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            request_timeout=settings.OPENAI_REQUEST_TIMEOUT
+        )
+
+async def async_stream_openai_chat(messages, on_delta, tools=None, tool_choice="auto"):
+    """
+    Streams a ChatCompletion and forwards every content token to ``on_delta``
+    as soon as it arrives. Returns the assembled assistant message, shaped like
+    the non-streamed ``choices[0]["message"]`` so callers can treat both alike.
+    """
+    content_parts = []
+    tool_calls = {}
+    # The slot is held until the stream is fully read
+    async with upstream_pool.slot():
+        response = await openai.ChatCompletion.acreate(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            stream=True,
+            request_timeout=settings.OPENAI_REQUEST_TIMEOUT
+        )
+
+        async for chunk in response:
+            delta = chunk["choices"][0].get("delta", {})
+
+            token = delta.get("content")
+            if token:
+                content_parts.append(token)
+                await on_delta(token)
+
+            # Tool calls arrive in pieces, keyed by index: id and name first, then argument fragments
+            for call_delta in delta.get("tool_calls") or []:
+                call = tool_calls.setdefault(call_delta["index"], {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                call["id"] += call_delta.get("id") or ""
+                function = call_delta.get("function") or {}
+                call["function"]["name"] += function.get("name") or ""
+                call["function"]["arguments"] += function.get("arguments") or ""
+
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    return message
+
+async def get_assistant_message(messages, on_delta=None, allow_tools=True, stats=None):
+    """
+    Runs one ChatCompletion round and returns the assistant message.
+    Streams tokens through ``on_delta`` when a callback is given.
+    With ``allow_tools`` off the model has to answer in text.
+    Concurrent calls with the same messages share one upstream request.
+    Token usage and latency are added to ``stats`` (a ``TurnStats``) if given.
+    """
+    tool_choice = "auto" if allow_tools else "none"
+
+    async def call(publish=None):
+        if publish is not None:
+            # Tokens go to the shared feed; each caller forwards them from its own task
+            message = await async_stream_openai_chat(messages, publish, tools=TOOLS, tool_choice=tool_choice)
+            # Streamed replies carry no usage block; count locally
+            usage = {
+                "prompt_tokens": estimate_prompt_tokens(messages, TOOLS, settings.OPENAI_MODEL),
+                "completion_tokens": estimate_completion_tokens(message, settings.OPENAI_MODEL),
+            }
+            return message, usage
+        response = await async_call_openai_chat(messages, tools=TOOLS, tool_choice=tool_choice)
+        return response["choices"][0]["message"], response.get("usage") or {}
+
+    forwarded = []
+
+    async def forward(token):
+        forwarded.append(token)
+        await on_delta(token)
+
+    started = time.perf_counter()
+    (message, usage), shared = await llm_flight.do(
+        payload_key(messages, tool_choice), call, on_delta=forward if on_delta is not None else None
     )
+    if stats is not None:
+        # A shared reply was paid for by the caller that made the request
+        prompt_tokens = 0 if shared else usage.get("prompt_tokens", 0)
+        completion_tokens = 0 if shared else usage.get("completion_tokens", 0)
+        stats.add_llm_call(settings.OPENAI_MODEL, prompt_tokens, completion_tokens, time.perf_counter() - started)
+    if on_delta is not None and not forwarded and message.get("content"):
+        # The shared call wasn't streamed; hand the reply over in one piece
+        await on_delta(message["content"])
+    return message
 
-def format_function_response(function_name: str, content: dict):
+def format_tool_response(tool_call_id: str, content: dict):
     """
-    Format the function response message to feed back into the conversation
+    Format a tool result message to feed back into the conversation
     so the assistant can provide a final answer.
     """
     return {
-        "role": "function",
-        "name": function_name,
+        "role": "tool",
+        "tool_call_id": tool_call_id,
         "content": json.dumps(content, default=str)
     }
 
-async def process_conversation(user_query, session_id, user=None):
+async def run_tool_call(tool_call):
     """
-    - Loads up to last 10 messages from ChatMessage for context
-    - Calls OpenAI (1st call)
-    - If a function is requested, run it, then call OpenAI again (2nd call) with function role message
-    - Return a final reply
+    Executes one tool call requested by the assistant. Problems are returned
+    as ``{"error": ...}`` so the assistant can see them and recover.
     """
+    function_name = tool_call["function"]["name"]
+    raw_args = tool_call["function"].get("arguments") or "{}"
+
+    if function_name != "run_sql_query":
+        return {"error": f"Unknown function: {function_name}"}
+
+    # Attempt to parse function arguments
     try:
-        # 1. Validate session
-        session = await sync_to_async(ChatSession.objects.filter)(session_id=session_id)
-        session = await sync_to_async(session.first)()
-        if not session:
-            return {"error": "Invalid session ID."}
-
-        # 2. Load chat history
-        recent_messages = await sync_to_async(list)(
-            ChatMessage.objects.filter(session=session).order_by("-created_at")[:10]
-        )
+        args_dict = json.loads(raw_args)
+    except json.JSONDecodeError:
+        return {"error": "Function call error: Invalid JSON arguments."}
+
+    # Make sure we have a dict
+    if not isinstance(args_dict, dict):
+        return {"error": "Function call error: arguments must be a JSON object."}
+
+    lookup_spec = args_dict.get("lookup_spec", args_dict)
+    return await perform_db_lookup(lookup_spec)
+
+async def run_tool_calls(tool_calls, timeout):
+    """
+    Runs every tool call of one assistant turn concurrently, so the wait is
+    set by the slowest lookup. Lookups still running after ``timeout`` seconds
+    are cancelled and reported as timed out.
+    """
+    tasks = [asyncio.ensure_future(run_tool_call(tool_call)) for tool_call in tool_calls]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+    finally:
+        # Also reached when the turn itself is cancelled, e.g. on disconnect
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    results = []
+    for task in tasks:
+        if task in pending:
+            results.append({"error": "Lookup timed out."})
+        elif task.exception() is not None:
+            results.append({"error": f"Lookup failed: {task.exception()}"})
+        else:
+            results.append(task.result())
+    return results
+
+def history_entry(role, content, tokens, created_at):
+    return {"role": role, "content": content or "", "tokens": tokens, "created_at": created_at}
+
+def load_recent_messages(session):
+    """
+    The last ``HISTORY_LIMIT`` saved messages of a session not yet covered by
+    its summary, newest first.
+    Messages saved before token counts existed get theirs computed and stored once.
+    """
+    queryset = ChatMessage.objects.filter(session=session)
+    if session.summary_until:
+        queryset = queryset.filter(created_at__gt=session.summary_until)
+    recent_messages = list(queryset.order_by("-created_at")[:HISTORY_LIMIT])
+    uncounted = [msg for msg in recent_messages if msg.token_count is None]
+    for msg in uncounted:
+        msg.token_count = count_tokens(msg.content)
+    if uncounted:
+        ChatMessage.objects.bulk_update(uncounted, ["token_count"])
+    return recent_messages
+
+async def load_chat_history(session):
+    """
+    Loads the last ``HISTORY_LIMIT`` messages of a session, oldest first,
+    into a rolling window that drops the oldest entry as new ones are added.
+    """
+    # Include messages still waiting in the write-behind buffer. Taken before the
+    # query so a flush in between shows up as a duplicate (dropped by id) rather than a gap.
+    pending = message_writer.pending_for(session)
+    recent_messages = await sync_to_async(load_recent_messages)(session)
+    saved_ids = {msg.id for msg in recent_messages}
+    pending = [msg for msg in pending if msg.id is None or msg.id not in saved_ids]
+    if session.summary_until:
+        pending = [msg for msg in pending if msg.created_at > session.summary_until]
+    return deque(
+        (
+            history_entry(msg.role, msg.content, msg.token_count, msg.created_at)
+            for msg in list(reversed(recent_messages)) + pending
+        ),
+        maxlen=HISTORY_LIMIT
+    )
+
+async def load_session_state(session_id):
+    """
+    Returns ``(session, history)`` for a session id, or ``(None, None)`` if it doesn't exist.
+    """
+    with span("session_load"):
+        session = await sync_to_async(ChatSession.objects.filter(session_id=session_id).first)()
+    if not session:
+        return None, None
+    with span("history_load") as timing:
+        history = await load_chat_history(session)
+        timing["messages"] = len(history)
+    return session, history
 
-        chat_history = []
-        for msg in reversed(recent_messages):
-            content = msg.content if msg.content is not None else ""
-            chat_history.append({"role": msg.role, "content": content})
+async def save_message(session, history, role, content, **fields):
+    """
+    Queues a message for persistence and appends it to the in-memory history window.
+    The token count is computed here once and stored with the message, along with
+    any extra ``fields`` (the accounting of assistant messages).
+    Once a reply completes a turn, older messages may be folded into the session summary.
+    """
+    tokens = count_tokens(content)
+    message = await message_writer.add(session, role, content, token_count=tokens, **fields)
+    history.append(history_entry(role, content, tokens, message.created_at))
+    if role == "assistant":
+        maybe_schedule_summary(session, history)
 
+async def process_conversation(user_query, session_id, user=None, on_delta=None):
+    """
+    - Loads the session and its recent messages from ChatMessage for context
+    - Hands over to ``process_session_conversation``
+    """
+    session, history = await load_session_state(session_id)
+    if not session:
+        return {"error": "Invalid session ID."}
+    try:
+        return await process_session_conversation(user_query, session, history, user=user, on_delta=on_delta)
+    finally:
+        # No connection lifecycle here to flush on, so write the turn out now
+        await message_writer.flush()
 
-        # 3. Build the conversation: system + history + new user query
-        messages = [{"role": "system", "content": build_system_prompt()}] + chat_history
+async def answer_from_intent(user_query, stats=None):
+    """
+    Answers common query shapes locally (see ``intents.match_intent``).
+    Returns the reply text, or ``None`` to let the LLM handle the query.
+    """
+    intent = match_intent(user_query)
+    if intent is None:
+        return None
+    intent_name, lookup_spec, render = intent
+    started = time.perf_counter()
+    with span("fast_path", intent=intent_name):
+        result = await perform_db_lookup(lookup_spec)
+    if stats is not None:
+        stats.add_lookups([lookup_spec], time.perf_counter() - started)
+    if "error" in result:
+        return None
+    return render(result)
+
+async def process_session_conversation(user_query, session, history, user=None, on_delta=None):
+    """
+    - Uses an already loaded session and history window (see ``load_session_state``)
+    - Answers recognized common queries directly from the database, without OpenAI
+    - Otherwise calls OpenAI; every lookup it asks for in one turn runs concurrently
+    - Feeds the results back and calls OpenAI again, for at most ``CHAT_MAX_TOOL_STEPS`` rounds
+      of lookups and within ``CHAT_TURN_TIME_BUDGET`` seconds, then asks for a final reply
+    - Return a final reply
+    - If ``on_delta`` is given, the answer is streamed through it token by token
+    - ``history`` is updated in place with the new user and assistant messages
+    """
+    started = time.perf_counter()
+    stats = TurnStats()
+    try:
+        # 1. Build the conversation: system + summary of older turns
+        #    + as much recent history as the budget allows + new user query
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        budget = settings.HISTORY_TOKEN_BUDGET - system_prompt_tokens() - count_tokens(user_query)
+        if session.summary:
+            summary = f"Summary of the earlier conversation:\n{session.summary}"
+            messages.append({"role": "system", "content": summary})
+            budget -= count_tokens(summary)
+        messages += select_within_budget(history, budget)
         messages.append({"role": "user", "content": user_query})
 
         # Save the user's message
-        await sync_to_async(ChatMessage.objects.create)(
-            session=session, role="user", content=user_query
-        )
+        await save_message(session, history, "user", user_query)
+
+        # 2. Fast path: common queries skip the LLM entirely
+        if settings.CHAT_FAST_PATH:
+            fast_reply = await answer_from_intent(user_query, stats)
+            if fast_reply is not None:
+                if on_delta is not None:
+                    await on_delta(fast_reply)
+                stats.path = "fast_path"
+                await save_message(session, history, "assistant", fast_reply, **stats.message_fields())
+                TURN_SECONDS.labels("fast_path").observe(time.perf_counter() - started)
+                return {"reply": fast_reply}
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.CHAT_TURN_TIME_BUDGET
+        max_steps = settings.CHAT_MAX_TOOL_STEPS
 
         # ---------------------------
-        # 4. First call to OpenAI
+        # 3. Tool loop: call OpenAI, run the lookups it requests, repeat
         # ---------------------------
-        initial_response = await async_call_openai_chat(messages, functions=FUNCTIONS, function_call="auto")
-        first_assistant_msg = initial_response["choices"][0]["message"]
-
-        print(first_assistant_msg)
-
-        # Extract potential function call
-        func_call = first_assistant_msg.get("function_call")
-        assistant_reply = first_assistant_msg.get("content") or ""
-
-        if func_call:
-            # ================
-            # 4a. There's a function call
-            # ================
-            function_name = func_call["name"]
-            raw_args = func_call.get("arguments", "{}")
-
-            # Attempt to parse function arguments
-            try:
-                args_dict = json.loads(raw_args)
-            except json.JSONDecodeError:
-                error_msg = "Function call error: Invalid JSON arguments."
-                await sync_to_async(ChatMessage.objects.create)(
-                    session=session, role="assistant", content=error_msg
+        for step in range(max_steps + 1):
+            # On the last step, or once the time budget is spent, a text answer is required
+            allow_tools = step < max_steps and loop.time() < deadline
+            with span("llm_first" if step == 0 else "llm_followup", step=step) as timing:
+                assistant_msg = await get_assistant_message(
+                    messages, on_delta=on_delta, allow_tools=allow_tools, stats=stats
                 )
-                return {"reply": error_msg}
+                timing["tool_calls"] = len(assistant_msg.get("tool_calls") or [])
 
-            # Make sure we have a dict
-            if not isinstance(args_dict, dict):
-                error_msg = "Function call error: arguments must be a JSON object."
-                await sync_to_async(ChatMessage.objects.create)(
-                    session=session, role="assistant", content=error_msg
-                )
-                return {"reply": error_msg}
-
-            # 5. Perform the actual function logic (db_lookup)
-            if function_name == "run_sql_query":
-                lookup_spec = args_dict.get("lookup_spec", args_dict)
-                print("DEBUG function_name:", function_name)
-                print("DEBUG lookup_spec:", lookup_spec)
-                db_results = await perform_db_lookup(lookup_spec)
-                print("DEBUG db_results from perform_db_lookup:", db_results)
-
-                # Format or store db_results
-                # We'll feed it back to the assistant as a function role message
-                function_msg = format_function_response(function_name, db_results)
-
-                # Append the function role message so the assistant can finalize the reply
-                messages.append(first_assistant_msg)  # The assistant function call
-                messages.append(function_msg)         # The function result
-
-                # ---------------------------
-                # 5a. Second call to OpenAI
-                # ---------------------------
-                second_response = await async_call_openai_chat(
-                    messages,
-                    functions=FUNCTIONS,
-                    function_call="auto"
-                )
+            tool_calls = assistant_msg.get("tool_calls")
+            if not tool_calls:
+                break
 
-                second_assistant_msg = second_response["choices"][0]["message"]
-                final_text = second_assistant_msg.get("content", "")
+            # 3a. Perform every requested lookup at once and hand the results back
+            lookups_started = loop.time()
+            results = await run_tool_calls(tool_calls, deadline - loop.time())
+            stats.add_tool_calls(tool_calls, loop.time() - lookups_started)
 
-                # Save final assistant response
-                await sync_to_async(ChatMessage.objects.create)(
-                    session=session, role="assistant", content=final_text
-                )
-                return {"reply": final_text or "No final answer provided."}
-            else:
-                # Unsupported function, just respond with an error
-                error_msg = f"Unknown function: {function_name}"
-                await sync_to_async(ChatMessage.objects.create)(
-                    session=session, role="assistant", content=error_msg
-                )
-                return {"reply": error_msg}
-        else:
-            # ================
-            # 4b. No function call
-            # ================
-            if not assistant_reply.strip():
-                # If there's truly no text, provide a fallback
-                assistant_reply = "I'm not sure how to respond. Could you clarify?"
-
-            # Save final assistant response
-            await sync_to_async(ChatMessage.objects.create)(
-                session=session, role="assistant", content=assistant_reply
-            )
-            return {"reply": assistant_reply}
+            messages.append(assistant_msg)  # The assistant tool calls
+            for tool_call, result in zip(tool_calls, results):
+                messages.append(format_tool_response(tool_call["id"], result))
+
+        # ================
+        # 4. Final answer
+        # ================
+        assistant_reply = assistant_msg.get("content") or ""
+        if not assistant_reply.strip():
+            # If there's truly no text, provide a fallback
+            assistant_reply = "I'm not sure how to respond. Could you clarify?"
+
+        # Save final assistant response
+        await save_message(session, history, "assistant", assistant_reply, **stats.message_fields())
+        TURN_SECONDS.labels("llm").observe(time.perf_counter() - started)
+        return {"reply": assistant_reply}
     except Exception as e:
         # Log the traceback, store a user-friendly message
+        logger.exception("Chat turn failed for session %s", session.session_id)
         error_message = f"An error occurred: {str(e)}\n{traceback.format_exc()}"
-        await sync_to_async(ChatMessage.objects.create)(
-            session=session, role="assistant", content=error_message
-        )
+        stats.path = "error"
+        await save_message(session, history, "assistant", error_message, **stats.message_fields())
+        TURN_SECONDS.labels("error").observe(time.perf_counter() - started)
         return {"reply": "Something went wrong. Our team has been notified."}
-
@@ -0,0 +1,135 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, When
+
+from customers.models import Customer
+from products.models import Product
+
+logger = logging.getLogger("chat.search")
+
+# Text columns covered by the search index of each model
+SEARCH_FIELDS = {
+    Customer: ["name"],
+    Product: ["name", "description"],
+}
+
+# lookup_spec model -> (indexed model, path to it). Searching orders matches
+# their customer's name, searching order items or sales their product.
+SEARCH_TARGETS = {
+    "Customer": (Customer, "pk"),
+    "Product": (Product, "pk"),
+    "Order": (Customer, "customer"),
+    "OrderItem": (Product, "product"),
+    "DailyProductSales": (Product, "product"),
+}
+
+# Alias used to order searched rows by relevance of their matched row
+SEARCH_RANK = "search_rank"
+
+
+def trigrams(text):
+    """Lowercase three-letter windows of every word, as the trigram indexes see them."""
+    grams = set()
+    for word in str(text or "").lower().split():
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def similarity(query_grams, text):
+    """Share of the query's trigrams found in ``text``, from 0 to 1."""
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(text)) / len(query_grams)
+
+
+def sqlite_ranked_ids(Model, term, limit):
+    """
+    Candidates come from the FTS5 trigram table (any shared trigram, best
+    bm25 first); they're then scored by trigram overlap so misspellings
+    still match while unrelated rows sharing one trigram drop out.
+    """
+    grams = trigrams(term)
+    if not grams:
+        return None
+    table = f"{Model._meta.db_table}_fts"
+    columns = SEARCH_FIELDS[Model]
+    match = " OR ".join('"{}"'.format(gram.replace('"', '""')) for gram in sorted(grams))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s",
+            [match, limit]
+        )
+        candidates = cursor.fetchall()
+
+    threshold = settings.SEARCH_MIN_SIMILARITY
+    scored = []
+    for position, (pk, *texts) in enumerate(candidates):
+        score = max(similarity(grams, text) for text in texts)
+        if score >= threshold:
+            scored.append((-score, position, pk))
+    return [pk for _, _, pk in sorted(scored)]
+
+
+def postgres_ranked_ids(Model, term, limit):
+    """Word similarity against the pg_trgm GIN indexes, most similar first."""
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models.functions import Greatest
+
+    columns = SEARCH_FIELDS[Model]
+    matches = Q()
+    for column in columns:
+        matches |= Q(**{f"{column}__trigram_word_similar": term})
+    scores = [TrigramWordSimilarity(term, column) for column in columns]
+    score = Greatest(*scores) if len(scores) > 1 else scores[0]
+    queryset = Model.objects.filter(matches).annotate(similarity=score).order_by("-similarity", "-pk")
+    return list(queryset.values_list("pk", flat=True)[:limit])
+
+
+def fallback_ids(Model, term, limit):
+    """Plain substring match for terms too short for trigrams or a missing index."""
+    matches = Q()
+    for column in SEARCH_FIELDS[Model]:
+        matches |= Q(**{f"{column}__icontains": term})
+    return list(Model.objects.filter(matches).order_by("-pk").values_list("pk", flat=True)[:limit])
+
+
+def ranked_ids(Model, term):
+    """Primary keys of ``Model`` rows matching ``term``, best match first."""
+    limit = settings.SEARCH_CANDIDATES
+    term = " ".join(str(term).split())
+    ids = None
+    try:
+        if connection.vendor == "sqlite":
+            ids = sqlite_ranked_ids(Model, term, limit)
+        elif connection.vendor == "postgresql" and len(term) >= 3:
+            ids = postgres_ranked_ids(Model, term, limit)
+    except DatabaseError as e:
+        logger.warning("Search index unavailable for %s, matching substrings: %s", Model.__name__, e)
+    if ids is None:
+        ids = fallback_ids(Model, term, limit)
+    return ids
+
+
+def apply_search(model_name, queryset, term):
+    """
+    Restricts ``queryset`` to rows matching ``term`` through the search index.
+
+    Returns ``(queryset, ranked)``; when ``ranked`` is True the queryset has a
+    ``search_rank`` alias to order by relevance. Rows reached through a
+    relation (orders of a customer, items of a product) share the rank of
+    the row they matched. Raises ValueError for models without a searchable
+    text column.
+    """
+    if model_name not in SEARCH_TARGETS:
+        raise ValueError(f"Search isn't supported on {model_name}; use filters instead")
+    Model, path = SEARCH_TARGETS[model_name]
+    ids = ranked_ids(Model, term)
+    queryset = queryset.filter(**{f"{path}__in": ids})
+    if ids:
+        queryset = queryset.alias(**{SEARCH_RANK: Case(
+            *[When(**{path: pk}, then=position) for position, pk in enumerate(ids)],
+            output_field=IntegerField()
+        )})
+    return queryset, bool(ids)
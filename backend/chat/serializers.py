@@ -1,13 +1,28 @@
 from rest_framework import serializers
 from .models import ChatMessage, ChatSession
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Limits the output to ``?fields=a,b`` when the request asks for it;
+    unknown names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        requested = request.query_params.get("fields") if request else None
+        if requested:
+            keep = {name.strip() for name in requested.split(",")}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+class ChatMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = '__all__'
 
-class ChatSessionSerializer(serializers.ModelSerializer):
+class ChatSessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ChatSession
-        fields = '__all__'
-
+        # The owner's session key would let anyone holding it act as them
+        exclude = ['anonymous_key']
+        read_only_fields = ['user']
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from orders.models import DailyOrderStats, DailyProductSales, Order, OrderItem
+from customers.models import Customer
+from products.models import Product
+
+from .lookup_cache import lookup_cache
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_lookup_cache(sender, **kwargs):
+    models = [sender]
+    # Rollups are updated in place with F() expressions, which send no signals
+    if sender in (Order, OrderItem):
+        models += [DailyOrderStats, DailyProductSales]
+
+    # Bumping before the commit would let a concurrent lookup read the old rows
+    # and cache them under the new version, so wait until they're visible
+    def bump():
+        for model in models:
+            lookup_cache.invalidate(model)
+
+    transaction.on_commit(bump)
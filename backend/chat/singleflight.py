@@ -0,0 +1,120 @@
+import json
+import asyncio
+import hashlib
+import weakref
+
+
+def payload_key(*parts):
+    """Stable hash of JSON-serializable request parts."""
+    canonical = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class Feed:
+    """
+    Tokens published by a shared call, replayed to every caller that follows
+    it: those arriving late get the tokens so far, then the live ones.
+    """
+    def __init__(self):
+        self.tokens = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    async def publish(self, token):
+        self.tokens.append(token)
+        self._changed.set()
+
+    def close(self):
+        self.closed = True
+        self._changed.set()
+
+    async def follow(self, on_delta):
+        position = 0
+        while True:
+            while position < len(self.tokens):
+                await on_delta(self.tokens[position])
+                position += 1
+            if self.closed:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+
+class Flight:
+    """One in-flight call: its task, the callers waiting on it and its token feed."""
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.feed = Feed()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await that same task instead of repeating the work. The
+    task is shielded, so a cancelled caller doesn't cancel it for the others,
+    but it is cancelled once every caller waiting on it has been.
+    Tasks are tied to an event loop, so in-flight work is tracked per loop.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._by_loop = weakref.WeakKeyDictionary()
+
+    async def do(self, key, factory, on_delta=None):
+        """
+        Returns ``(result, shared)``: ``shared`` is True when the result came
+        from a call another caller had already started.
+
+        With ``on_delta``, a call this caller starts gets a ``publish(token)``
+        coroutine as its argument, and every caller passing ``on_delta`` is
+        sent the published tokens from its own task. The shared task never
+        runs a caller's callback, so cancelling a caller stops its output.
+        """
+        loop = asyncio.get_running_loop()
+        inflight = self._by_loop.setdefault(loop, {})
+
+        flight = inflight.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            flight = Flight()
+            flight.task = loop.create_task(factory(flight.feed.publish) if on_delta is not None else factory())
+            inflight[key] = flight
+
+            def finished(_, flight=flight):
+                flight.feed.close()
+                if inflight.get(key) is flight:
+                    del inflight[key]
+            flight.task.add_done_callback(finished)
+
+        flight.waiters += 1
+        follower = loop.create_task(flight.feed.follow(on_delta)) if on_delta is not None else None
+        try:
+            result = await asyncio.shield(flight.task)
+            if follower is not None:
+                # Forward whatever was published after this caller's last token
+                await follower
+            return result, shared
+        finally:
+            flight.waiters -= 1
+            if follower is not None and not follower.done():
+                follower.cancel()
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller gave up: stop the work and let the next caller start afresh
+                flight.task.cancel()
+                if inflight.get(key) is flight:
+                    del inflight[key]
+
+    def stats(self):
+        total = self.calls + self.coalesced
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
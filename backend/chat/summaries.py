@@ -0,0 +1,86 @@
+import re
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import ChatSession
+from .tokens import count_tokens
+
+logger = logging.getLogger("chat.summaries")
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Sessions with a summary being written, and the tasks doing it
+_in_progress = set()
+_tasks = set()
+
+
+def first_sentence(text, max_chars=200):
+    text = " ".join((text or "").split())
+    sentence = SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars].rstrip() + "..."
+    return sentence
+
+
+def summarize_turns(previous_summary, entries, token_limit):
+    """
+    Extractive summary: one line per message with its first sentence, appended
+    to the previous summary. The oldest lines are dropped once the summary
+    exceeds ``token_limit``, so its size stays bounded however long the session runs.
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for entry in entries:
+        sentence = first_sentence(entry["content"])
+        if sentence:
+            speaker = "User" if entry["role"] == "user" else "Assistant"
+            lines.append(f"- {speaker}: {sentence}")
+
+    while lines and count_tokens("\n".join(lines)) > token_limit:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+async def summarize_session(session, history, entries):
+    """
+    Folds ``entries`` (the oldest messages of ``history``) into the session
+    summary, stores it, then drops those entries from the in-memory window.
+    """
+    try:
+        summary = summarize_turns(session.summary, entries, settings.CHAT_SUMMARY_TOKEN_LIMIT)
+        summary_until = entries[-1]["created_at"]
+        await sync_to_async(ChatSession.objects.filter(pk=session.pk).update)(
+            summary=summary, summary_until=summary_until
+        )
+        session.summary = summary
+        session.summary_until = summary_until
+
+        # New messages are only ever appended, so the summarized ones are still at the front
+        summarized = {id(entry) for entry in entries}
+        while history and id(history[0]) in summarized:
+            history.popleft()
+    except Exception:
+        logger.exception("Summary failed for session %s", session.session_id)
+    finally:
+        _in_progress.discard(session.pk)
+
+
+def maybe_schedule_summary(session, history):
+    """
+    Starts a background summary once the window holds more than
+    ``CHAT_SUMMARY_TRIGGER`` messages, keeping the newest
+    ``CHAT_SUMMARY_KEEP_RECENT`` of them verbatim.
+    """
+    if len(history) <= settings.CHAT_SUMMARY_TRIGGER or session.pk in _in_progress:
+        return
+    entries = list(history)[:-settings.CHAT_SUMMARY_KEEP_RECENT]
+    if not entries:
+        return
+
+    _in_progress.add(session.pk)
+    task = asyncio.get_running_loop().create_task(summarize_session(session, history, entries))
+    # Keep a reference so the task isn't garbage collected before it finishes
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
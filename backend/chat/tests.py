@@ -1,3 +1,933 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .models import ChatSession
+from .routing import websocket_urlpatterns
+
+
+async def fake_conversation(user_query, session, history, user=None, on_delta=None):
+    from .openai_utils import history_entry
+    from django.utils.timezone import now
+    history.append(history_entry("user", user_query, 1, now()))
+    history.append(history_entry("assistant", f"echo: {user_query}", 2, now()))
+    return {"reply": f"echo: {user_query}"}
+
+
+async def slow_conversation(user_query, session, history, user=None, on_delta=None):
+    await asyncio.sleep(0.5)
+    return {"reply": f"slow: {user_query}"}
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ConsumerTestCase(TransactionTestCase):
+    async def connect(self, session):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/chat/{session.session_id}/")
+        communicator.scope["user"] = mock.Mock(is_authenticated=False)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())["type"], "session_connected")
+        return communicator
+
+
+class SessionGroupTests(ConsumerTestCase):
+    async def test_every_socket_on_a_session_gets_the_reply(self):
+        from asgiref.sync import sync_to_async
+        session = await sync_to_async(ChatSession.objects.create)(title="Shared")
+        first = await self.connect(session)
+        second = await self.connect(session)
+
+        with mock.patch("chat.openai_utils.process_session_conversation", fake_conversation):
+            await first.send_json_to({"query": "hello", "session_id": str(session.session_id)})
+            reply = await first.receive_json_from()
+            self.assertEqual(reply, {"type": "chat_response", "reply": "echo: hello"})
+
+            # The other socket sees the question, then the same reply
+            self.assertEqual(await second.receive_json_from(), {"type": "chat_message", "role": "user", "content": "hello"})
+            self.assertEqual(await second.receive_json_from(), reply)
+
+            # Either socket can ask; the first one sees that turn as well
+            await second.send_json_to({"query": "again", "session_id": str(session.session_id)})
+            self.assertEqual((await second.receive_json_from())["reply"], "echo: again")
+            self.assertEqual((await first.receive_json_from())["content"], "again")
+            self.assertEqual((await first.receive_json_from())["reply"], "echo: again")
+
+        await first.disconnect()
+        await second.disconnect()
+
+
+class RequestQueueTests(ConsumerTestCase):
+    async def ask_twice(self, overflow):
+        from asgiref.sync import sync_to_async
+        session = await sync_to_async(ChatSession.objects.create)(title="Busy")
+        socket = await self.connect(session)
+        with self.settings(CHAT_QUEUE_SIZE=0, CHAT_QUEUE_OVERFLOW=overflow), \
+                mock.patch("chat.openai_utils.process_session_conversation", slow_conversation):
+            await socket.send_json_to({"query": "first", "session_id": str(session.session_id)})
+            await asyncio.sleep(0.1)
+            await socket.send_json_to({"query": "second", "session_id": str(session.session_id)})
+            frames = [await socket.receive_json_from(timeout=2) for _ in range(2 if overflow == "reject" else 3)]
+        await socket.disconnect()
+        return frames
+
+    async def test_reject_keeps_the_question_in_progress(self):
+        busy, reply = await self.ask_twice("reject")
+        self.assertEqual((busy["type"], busy["reason"], busy["query"]), ("busy", "rejected", "second"))
+        self.assertEqual(reply["reply"], "slow: first")
+
+    async def test_replace_cancels_the_question_in_progress(self):
+        busy, cancelled, reply = await self.ask_twice("replace")
+        self.assertEqual((busy["type"], busy["reason"]), ("busy", "replaced"))
+        self.assertEqual(cancelled["type"], "chat_cancelled")
+        self.assertEqual(reply["reply"], "slow: second")
+
+    async def test_replace_stops_the_streamed_reply_in_progress(self):
+        from asgiref.sync import sync_to_async
+        upstream = {}
+
+        async def fake_stream(messages, on_delta, tools=None, tool_choice="auto"):
+            query = messages[-1]["content"]
+            upstream[query] = "streaming"
+            try:
+                for i in range(10):
+                    await asyncio.sleep(0.03)
+                    await on_delta(f"{query}-{i} ")
+            except asyncio.CancelledError:
+                upstream[query] = "cancelled"
+                raise
+            upstream[query] = "finished"
+            return {"role": "assistant", "content": "done"}
+
+        session = await sync_to_async(ChatSession.objects.create)(title="Streams")
+        socket = await self.connect(session)
+        with self.settings(CHAT_QUEUE_SIZE=0, CHAT_QUEUE_OVERFLOW="replace", CHAT_FAST_PATH=False), \
+                mock.patch("chat.openai_utils.async_stream_openai_chat", fake_stream):
+            await socket.send_json_to({"query": "first", "session_id": str(session.session_id), "stream": True})
+            await asyncio.sleep(0.1)
+            await socket.send_json_to({"query": "second", "session_id": str(session.session_id), "stream": True})
+            frames = []
+            while not frames or frames[-1]["type"] != "chat_done":
+                frames.append(await socket.receive_json_from(timeout=3))
+        await socket.disconnect()
+
+        types = [frame["type"] for frame in frames]
+        after_cancel = frames[types.index("chat_cancelled"):]
+        self.assertFalse([f for f in after_cancel if f["type"] == "chat_delta" and f["delta"].startswith("first")])
+        self.assertEqual(
+            "".join(f["delta"] for f in after_cancel if f["type"] == "chat_delta"),
+            "".join(f"second-{i} " for i in range(10))
+        )
+        self.assertEqual(upstream, {"first": "cancelled", "second": "finished"})
+
+
+class FakeEncoding:
+    """One token per word, standing in for a downloaded tiktoken encoding."""
+    def encode(self, text):
+        return text.split()
+
+
+@override_settings(OPENAI_MODEL="test-model")
+class TokenCountTests(SimpleTestCase):
+    def setUp(self):
+        from . import tokens
+        self.tokens = tokens
+        patcher = mock.patch.dict(tokens._encodings, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_are_estimated_until_the_tokenizer_is_loaded(self):
+        self.assertEqual(self.tokens.count_tokens("a" * 10), 3)
+        self.assertEqual(self.tokens.count_tokens(""), 0)
+
+        with mock.patch("tiktoken.encoding_for_model", return_value=FakeEncoding()) as load:
+            self.tokens.load_encoding()
+        load.assert_called_once_with("test-model")
+        self.assertEqual(self.tokens.count_tokens("three short words"), 3)
+
+    def test_a_failed_load_is_tried_again(self):
+        with mock.patch("tiktoken.encoding_for_model", side_effect=[OSError("offline"), FakeEncoding()]), \
+                self.assertLogs("chat.tokens", "WARNING"):
+            self.assertIsNone(self.tokens.load_encoding())
+            self.assertIsNone(self.tokens.get_encoding())
+            self.assertIsNotNone(self.tokens.load_encoding())
+        self.assertIsNotNone(self.tokens.get_encoding())
+
+    def test_preload_retries_in_the_background(self):
+        with mock.patch("tiktoken.encoding_for_model", side_effect=[OSError("offline"), FakeEncoding()]), \
+                mock.patch.object(self.tokens, "LOAD_RETRY_DELAYS", (0,)), \
+                self.assertLogs("chat.tokens", "WARNING"):
+            self.tokens.preload_encoding().join(timeout=5)
+        self.assertIsInstance(self.tokens.get_encoding(), FakeEncoding)
+
+
+class LookupCacheInvalidationTests(TestCase):
+    def versions(self):
+        from .lookup_cache import lookup_cache
+        return asyncio.run(lookup_cache.get_versions(["customers.Customer"]))["customers.Customer"]
+
+    def test_versions_are_bumped_after_the_commit(self):
+        from customers.models import Customer
+        before = self.versions()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Customer.objects.create(name="Ada", email="ada@example.com", phone="5550100")
+            # Still inside the transaction: a lookup now must not see a new version
+            self.assertEqual(self.versions(), before)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.versions(), before + 1)
+
+
+class LookupSpecValidationTests(TestCase):
+    def lookup(self, **spec):
+        from .db_lookup import perform_db_lookup
+        return asyncio.run(perform_db_lookup({"model": "Customer", **spec}))
+
+    def test_malformed_arguments_are_reported(self):
+        self.assertIn("Invalid filters", self.lookup(filters=["name", "Ada"])["error"])
+        self.assertIn("Invalid fields", self.lookup(fields={"name": True})["error"])
+        self.assertIn("Invalid group_by", self.lookup(group_by=[{"field": "name"}])["error"])
+        self.assertIn("Invalid group_by", self.lookup(order_by=5)["error"])
+
+    def test_a_single_field_name_is_accepted(self):
+        self.assertEqual(self.lookup(fields="name", filters={"name": "nobody"})["rows"], [])
+
+
+class AggregateLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from decimal import Decimal
+        from customers.models import Customer
+        from orders.models import Order, OrderItem
+        from products.models import Product
+        ada = Customer.objects.create(name="Ada", email="ada@example.com", phone="5550100")
+        cards = Product.objects.create(name="Cards", category="Print", price=Decimal("2.50"), stock_quantity=10)
+        flyers = Product.objects.create(name="Flyers", category="Print", price=Decimal("0.40"), stock_quantity=10)
+        for status, items in [("pending", [(cards, 2)]), ("pending", [(flyers, 10)]), ("completed", [(cards, 4), (flyers, 5)])]:
+            order = Order.objects.create(customer=ada, status=status)
+            for product, quantity in items:
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+
+    def lookup(self, model_name, **spec):
+        from .db_lookup import MODEL_MAPPING, filtered_queryset
+        return filtered_queryset(
+            MODEL_MAPPING[model_name], spec.pop("filters", {}), spec.pop("fields", []), limit=10, **spec
+        )
+
+    def test_count_and_sum_per_group(self):
+        from decimal import Decimal
+        rows = self.lookup(
+            "Order", aggregate={"orders": {"op": "count", "field": "id"}}, group_by=["status"]
+        )["rows"]
+        self.assertEqual(rows, [{"status": "completed", "orders": 1}, {"status": "pending", "orders": 2}])
+
+        rows = self.lookup(
+            "OrderItem", aggregate={"sold": {"op": "sum", "field": "quantity"}, "revenue": {"op": "sum", "field": "line_total"}},
+            group_by=["product__name"]
+        )["rows"]
+        self.assertEqual(rows, [
+            {"product__name": "Cards", "sold": 6, "revenue": Decimal("15.00")},
+            {"product__name": "Flyers", "sold": 15, "revenue": Decimal("6.00")},
+        ])
+
+    def test_line_total_through_relation_prefixes(self):
+        from decimal import Decimal
+        rows = self.lookup(
+            "Order", aggregate={"revenue": {"op": "sum", "field": "items__line_total"}}, group_by=["status"]
+        )["rows"]
+        self.assertEqual(
+            [(row["status"], row["revenue"]) for row in rows],
+            [("completed", Decimal("12.00")), ("pending", Decimal("9.00"))]
+        )
+
+        result = self.lookup(
+            "Product", filters={"name": "Flyers"}, aggregate={"revenue": {"op": "sum", "field": "orderitem__line_total"}}
+        )
+        self.assertEqual(result["rows"], [{"revenue": Decimal("6.00")}])
+
+    def test_aggregate_mistakes_are_reported_as_such(self):
+        with self.assertLogs("chat.lookup", "INFO"):
+            error = self.lookup("Order", aggregate={"n": {"op": "count", "field": "line_total"}})["error"]
+            self.assertTrue(error.startswith("Invalid aggregate:"), error)
+            self.assertIn("items__line_total", error)
+            error = self.lookup("Customer", aggregate={"n": {"op": "sum", "field": "orders__line_total"}})["error"]
+            self.assertTrue(error.startswith("Invalid aggregate:"), error)
+            error = self.lookup("Order", aggregate={"n": {"op": "median", "field": "id"}})["error"]
+            self.assertEqual(error, "Invalid aggregate: Unknown aggregate operator 'median' for 'n'")
+
+
+class MessageWriterTests(TestCase):
+    def setUp(self):
+        from .message_writer import MessageWriter
+        self.writer = MessageWriter(max_batch=100, flush_interval=60)
+        self.session = ChatSession.objects.create(title="Writer")
+
+    def queue(self, content):
+        async def add():
+            message = await self.writer.add(self.session, "user", content)
+            self.writer._timer.cancel()
+            self.writer._timer = None
+            return message
+        return asyncio.run(add())
+
+    def test_a_batch_stays_visible_while_it_is_written(self):
+        from .models import ChatMessage
+        self.queue("hello")
+        seen = []
+        real_bulk_create = ChatMessage.objects.bulk_create
+
+        def bulk_create(batch):
+            seen.extend(msg.content for msg in self.writer.pending_for(self.session))
+            return real_bulk_create(batch)
+
+        with mock.patch.object(ChatMessage.objects, "bulk_create", side_effect=bulk_create):
+            self.assertTrue(self.writer.flush_sync())
+        self.assertEqual(seen, ["hello"])
+        self.assertEqual(self.writer.pending_for(self.session), [])
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 1)
+
+    def test_a_failed_flush_is_queued_and_retried(self):
+        from .models import ChatMessage
+        self.queue("hello")
+
+        async def flush():
+            await self.writer.flush()
+            timer, self.writer._timer = self.writer._timer, None
+            timer.cancel()
+            return timer
+
+        with mock.patch.object(ChatMessage.objects, "bulk_create", side_effect=RuntimeError("database is locked")), \
+                self.assertLogs("chat.persistence", "ERROR"):
+            self.assertIsNotNone(asyncio.run(flush()))
+        self.assertEqual([msg.content for msg in self.writer.pending_for(self.session)], ["hello"])
+
+    def test_a_bad_row_is_dead_lettered_and_the_rest_written(self):
+        from .models import ChatMessage
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.writer.dead_letter_path = os.path.join(directory.name, "dead.jsonl")
+        self.queue("before")
+        self.queue("bad")
+        self.queue("after")
+        # NOT NULL fails on every backend, like a NUL byte on PostgreSQL
+        self.writer._pending[1].role = None
+
+        with self.assertLogs("chat.persistence", "ERROR") as logs:
+            self.assertTrue(self.writer.flush_sync())
+        self.assertEqual(
+            list(ChatMessage.objects.filter(session=self.session).values_list("content", flat=True)),
+            ["before", "after"]
+        )
+        self.assertEqual(self.writer.pending_for(self.session), [])
+        self.assertIn("Dropping ChatMessage", logs.output[0])
+        with open(self.writer.dead_letter_path) as f:
+            record = json.loads(f.read())
+        self.assertEqual((record["session_id"], record["content"]), (self.session.id, "bad"))
+
+    def test_retries_stop_after_max_attempts(self):
+        from .models import ChatMessage
+        self.writer.max_attempts = 3
+        self.queue("hello")
+
+        with mock.patch.object(ChatMessage.objects, "bulk_create", side_effect=RuntimeError("database is locked")), \
+                self.assertLogs("chat.persistence", "ERROR") as logs:
+            self.assertEqual([self.writer.flush_sync() for _ in range(3)], [False, False, True])
+        self.assertEqual(self.writer.pending_for(self.session), [])
+        self.assertIn("Dropping ChatMessage", logs.output[-1])
+
+
+@override_settings(CHAT_SUMMARY_TRIGGER=4, CHAT_SUMMARY_KEEP_RECENT=2, CHAT_SUMMARY_TOKEN_LIMIT=100)
+class SummaryTests(TestCase):
+    def setUp(self):
+        from django.conf import settings
+        from . import tokens
+        patcher = mock.patch.dict(tokens._encodings, {settings.OPENAI_MODEL: FakeEncoding()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def history(self, count, start=0):
+        from collections import deque
+        from datetime import timedelta
+        from django.utils.timezone import now
+        from .openai_utils import HISTORY_LIMIT, history_entry
+        started = now()
+        return deque(
+            (
+                history_entry(
+                    "user" if i % 2 == 0 else "assistant", f"Message {i}. More detail.", 4,
+                    started + timedelta(seconds=i)
+                )
+                for i in range(start, start + count)
+            ),
+            maxlen=HISTORY_LIMIT
+        )
+
+    def test_turns_become_one_line_per_message(self):
+        from .summaries import summarize_turns
+        entries = list(self.history(2))
+        self.assertEqual(
+            summarize_turns("- User: Earlier.", entries, 100),
+            "- User: Earlier.\n- User: Message 0.\n- Assistant: Message 1."
+        )
+
+    def test_the_oldest_lines_are_cut_to_the_token_limit(self):
+        from .summaries import summarize_turns
+        # Every line is four words, so four tokens with the fake encoding
+        summary = summarize_turns("", list(self.history(5)), 9)
+        self.assertEqual(summary, "- Assistant: Message 3.\n- User: Message 4.")
+
+    async def wait_for_summaries(self):
+        from .summaries import _tasks
+        await asyncio.gather(*_tasks)
+
+    async def test_a_summary_starts_once_the_window_passes_the_trigger(self):
+        from asgiref.sync import sync_to_async
+        from .summaries import maybe_schedule_summary
+        session = await sync_to_async(ChatSession.objects.create)(title="Long")
+        history = self.history(4)
+        maybe_schedule_summary(session, history)
+        await self.wait_for_summaries()
+        self.assertEqual((session.summary, len(history)), ("", 4))
+
+        history += self.history(1, start=4)
+        maybe_schedule_summary(session, history)
+        await self.wait_for_summaries()
+        # All but the newest two are folded in and dropped from the window
+        self.assertEqual([entry["content"] for entry in history], ["Message 3. More detail.", "Message 4. More detail."])
+        self.assertEqual(session.summary.splitlines()[-1], "- User: Message 2.")
+        saved = await sync_to_async(ChatSession.objects.get)(pk=session.pk)
+        self.assertEqual((saved.summary, saved.summary_until), (session.summary, session.summary_until))
+        first_until = session.summary_until
+
+        # The next round continues the summary and moves summary_until forward
+        history += self.history(3, start=5)
+        last_folded = history[-3]
+        maybe_schedule_summary(session, history)
+        await self.wait_for_summaries()
+        self.assertEqual(len(session.summary.splitlines()), 6)
+        self.assertEqual(session.summary_until, last_folded["created_at"])
+        self.assertGreater(session.summary_until, first_until)
+        self.assertEqual(len(history), 2)
+
+    def test_history_skips_messages_covered_by_the_summary(self):
+        from datetime import timedelta
+        from django.utils.timezone import now
+        from .models import ChatMessage
+        from .openai_utils import load_recent_messages
+        started = now()
+        session = ChatSession.objects.create(title="Loaded", summary="- User: Old.", summary_until=started)
+        for i in range(-2, 3):
+            ChatMessage.objects.create(session=session, role="user", content=f"m{i}", created_at=started + timedelta(seconds=i))
+        self.assertEqual([msg.content for msg in load_recent_messages(session)], ["m2", "m1"])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from customers.models import Customer
+        from orders.models import Order
+        names = ["Mary Jones", "Jon Smithers", "John Smith", "Smith & Wesson Supplies"]
+        cls.customers = {
+            name: Customer.objects.create(name=name, email=f"c{i}@example.com", phone=f"555010{i}")
+            for i, name in enumerate(names)
+        }
+        cls.orders = {name: Order.objects.create(customer=customer) for name, customer in cls.customers.items()}
+
+    def lookup(self, model_name, search, fields):
+        from .db_lookup import MODEL_MAPPING, filtered_queryset
+        return filtered_queryset(MODEL_MAPPING[model_name], {}, fields, search=search, limit=10)["rows"]
+
+    def test_the_closest_name_comes_first(self):
+        names = [row["name"] for row in self.lookup("Customer", "john smith", ["name"])]
+        self.assertEqual(names[0], "John Smith")
+        self.assertIn("Jon Smithers", names)
+        self.assertNotIn("Mary Jones", names)
+
+    def test_misspellings_still_match(self):
+        # Shares "jon", "smi" and "mit" with Jon Smithers, fewer with John Smith
+        names = [row["name"] for row in self.lookup("Customer", "jon smitt", ["name"])]
+        self.assertEqual(names[:2], ["Jon Smithers", "John Smith"])
+
+    def test_related_rows_are_ranked_by_their_match(self):
+        rows = self.lookup("Order", "john smith", ["id", "customer__name"])
+        self.assertEqual(rows[0]["customer__name"], "John Smith")
+        self.assertNotIn("Mary Jones", [row["customer__name"] for row in rows])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_shared_work_stops_when_its_last_caller_is_cancelled(self):
+        from .singleflight import SingleFlight
+        flight = SingleFlight("test")
+        state = {}
+
+        async def work():
+            state["runs"] = state.get("runs", 0) + 1
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+            return "result"
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("key", work))
+            second = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            await asyncio.sleep(0.01)
+            self.assertNotIn("cancelled", state)
+
+            second.cancel()
+            await asyncio.sleep(0.01)
+            self.assertTrue(state["cancelled"])
+            # The next caller starts a new call instead of joining the cancelled one
+            third = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0.01)
+            third.cancel()
+
+        asyncio.run(run())
+        self.assertEqual(state["runs"], 2)
+
+    def test_followers_get_every_published_token(self):
+        from .singleflight import SingleFlight
+        flight = SingleFlight("test")
+
+        async def work(publish):
+            for token in "abc":
+                await publish(token)
+                await asyncio.sleep(0.01)
+            return "abc"
+
+        async def ask(delay):
+            await asyncio.sleep(delay)
+            received = []
+
+            async def on_delta(token):
+                received.append(token)
+            result, shared = await flight.do("key", work, on_delta=on_delta)
+            return result, shared, "".join(received)
+
+        async def run():
+            return await asyncio.gather(ask(0), ask(0.015))
+
+        self.assertEqual(asyncio.run(run()), [("abc", False, "abc"), ("abc", True, "abc")])
+
+
+class MetricsTests(SimpleTestCase):
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_span_times_stages_and_counts_errors(self):
+        from .metrics import span
+        count = self.sample("storechat_chat_stage_seconds_count", stage="test_stage")
+        errors = self.sample("storechat_chat_stage_errors_total", stage="test_stage")
+
+        with self.assertLogs("chat.timing", "DEBUG") as logs:
+            with span("test_stage", model="Order") as timing:
+                timing["rows"] = 3
+            with self.assertRaises(ValueError), span("test_stage"):
+                raise ValueError("boom")
+
+        self.assertEqual(self.sample("storechat_chat_stage_seconds_count", stage="test_stage"), count + 2)
+        self.assertEqual(self.sample("storechat_chat_stage_errors_total", stage="test_stage"), errors + 1)
+        self.assertIn("stage=test_stage", logs.output[0])
+        self.assertIn("outcome=ok model=Order rows=3", logs.output[0])
+        self.assertIn("outcome=error", logs.output[1])
+
+    def test_metrics_endpoint_serves_the_text_format(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"storechat_chat_stage_seconds", response.content)
+
+
+class LookupLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from customers.models import Customer
+        for i in range(5):
+            Customer.objects.create(name=f"Customer {i}", email=f"c{i}@example.com", phone=f"555010{i}")
+
+    def test_requested_limits_are_capped_per_model(self):
+        from .db_lookup import get_row_limit
+        with self.settings(LOOKUP_ROW_LIMITS={"default": 50, "Product": 100}):
+            self.assertEqual(get_row_limit("Customer"), 50)
+            self.assertEqual(get_row_limit("Customer", 500), 50)
+            self.assertEqual(get_row_limit("Product", 500), 100)
+            self.assertEqual(get_row_limit("Customer", "3"), 3)
+            self.assertEqual(get_row_limit("Customer", "lots"), 50)
+
+    def test_truncated_results_report_the_total(self):
+        from customers.models import Customer
+        from .db_lookup import filtered_queryset
+        result = filtered_queryset(Customer, {}, ["name"], limit=2)
+        self.assertEqual(result["rows"], [{"name": "Customer 4"}, {"name": "Customer 3"}])
+        self.assertEqual((result["truncated"], result["total"]), (True, 5))
+        self.assertNotIn("total_capped", result)
+
+        with self.settings(LOOKUP_COUNT_CAP=3):
+            result = filtered_queryset(Customer, {}, ["name"], limit=2)
+        self.assertEqual((result["total"], result["total_capped"]), (3, True))
+
+        result = filtered_queryset(Customer, {}, ["name"], limit=10)
+        self.assertEqual((len(result["rows"]), result["truncated"], result["total"]), (5, False, 5))
+
+
+class CoalescingTests(SimpleTestCase):
+    def test_identical_lookups_in_flight_share_one_query(self):
+        from .db_lookup import perform_db_lookup
+        queries = []
+
+        async def slow_query(ModelClass, filters, *args):
+            queries.append(filters)
+            await asyncio.sleep(0.05)
+            return {"rows": [{"name": "Ada"}], "truncated": False, "total": 1}
+
+        spec = {"model": "Customer", "filters": {"name": "coalescing test"}, "fields": ["name"]}
+
+        async def run():
+            return await asyncio.gather(*[perform_db_lookup(dict(spec)) for _ in range(3)])
+
+        with mock.patch("chat.db_lookup.get_filtered_queryset", slow_query):
+            results = asyncio.run(run())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(results, [results[0]] * 3)
+
+    def test_identical_llm_requests_share_one_call_and_its_cost(self):
+        from .accounting import TurnStats
+        from .openai_utils import get_assistant_message
+        calls = []
+
+        async def fake_call(messages, tools=None, tool_choice="auto"):
+            calls.append(messages)
+            await asyncio.sleep(0.05)
+            return {
+                "choices": [{"message": {"role": "assistant", "content": "Hi"}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10},
+            }
+
+        messages = [{"role": "user", "content": "coalescing test"}]
+        stats = [TurnStats(), TurnStats()]
+
+        async def run():
+            return await asyncio.gather(*[get_assistant_message(messages, stats=s) for s in stats])
+
+        with mock.patch("chat.openai_utils.async_call_openai_chat", fake_call):
+            replies = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([reply["content"] for reply in replies], ["Hi", "Hi"])
+        # Only the caller that made the request is charged for it
+        self.assertEqual(
+            sorted((s.prompt_tokens, s.completion_tokens) for s in stats), [(0, 0), (100, 10)]
+        )
+
+
+class UpstreamTests(SimpleTestCase):
+    """async_call_openai_chat against a local stub of the ChatCompletions endpoint."""
+
+    async def serve(self, delay):
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+        self.running, self.peak = 0, 0
+
+        async def chat_completions(request):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.running -= 1
+            return web.json_response({
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Hi"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            })
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat_completions)
+        server = TestServer(app)
+        await server.start_server()
+        return server
+
+    def call(self, delay, count, max_concurrency=64):
+        import openai
+        from .upstream import UpstreamPool
+        from .openai_utils import async_call_openai_chat
+        pool = UpstreamPool(max_concurrency)
+
+        async def run():
+            server = await self.serve(delay)
+            try:
+                with mock.patch.object(openai, "api_base", str(server.make_url("/v1"))), \
+                        mock.patch.object(openai, "api_key", "test"), \
+                        mock.patch("chat.openai_utils.upstream_pool", pool):
+                    calls = [async_call_openai_chat([{"role": "user", "content": "hi"}]) for _ in range(count)]
+                    return await asyncio.gather(*calls, return_exceptions=True)
+            finally:
+                await pool.close()
+                await server.close()
+
+        return asyncio.run(run())
+
+    def test_calls_beyond_the_concurrency_limit_wait(self):
+        results = self.call(delay=0.05, count=6, max_concurrency=2)
+        self.assertEqual([r["choices"][0]["message"]["content"] for r in results], ["Hi"] * 6)
+        self.assertEqual(self.peak, 2)
+
+    @override_settings(OPENAI_REQUEST_TIMEOUT=0.1)
+    def test_a_slow_upstream_times_out(self):
+        import openai
+        [result] = self.call(delay=2, count=1)
+        self.assertIsInstance(result, openai.error.Timeout)
+
+    def test_lifespan_shutdown_closes_the_pooled_session(self):
+        from storechat.asgi import application
+        from .upstream import upstream_pool
+        sent = []
+
+        async def run():
+            async with upstream_pool.slot():
+                session, _ = upstream_pool._state()
+            messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            with mock.patch("storechat.asgi.preload_encoding") as preload:
+                await application({"type": "lifespan"}, receive, send)
+            preload.assert_called_once_with()
+            return session
+
+        self.assertTrue(asyncio.run(run()).closed)
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+
+def tool_call(call_id, arguments):
+    return {"id": call_id, "type": "function", "function": {"name": "run_sql_query", "arguments": arguments}}
+
+
+@override_settings(CHAT_FAST_PATH=False)
+class ToolLoopTests(SimpleTestCase):
+    """The tool loop of process_session_conversation, against a scripted model."""
+
+    def run_turn(self, replies, lookup):
+        from .openai_utils import process_session_conversation
+        self.requests = []
+
+        async def fake_call(messages, tools=None, tool_choice="auto"):
+            self.requests.append((list(messages), tool_choice))
+            message = replies(len(self.requests), tool_choice)
+            return {"choices": [{"message": message}], "usage": {}}
+
+        async def save_message(*args, **kwargs):
+            pass
+
+        session = mock.Mock(summary="", session_id="tool-loop")
+        with mock.patch("chat.openai_utils.async_call_openai_chat", fake_call), \
+                mock.patch("chat.openai_utils.perform_db_lookup", lookup), \
+                mock.patch("chat.openai_utils.save_message", save_message):
+            return asyncio.run(process_session_conversation("tool loop test", session, []))
+
+    def tool_results(self, request):
+        messages, _ = self.requests[request]
+        return [json.loads(m["content"]) for m in messages if m["role"] == "tool"]
+
+    def test_the_lookups_of_one_turn_run_concurrently(self):
+        running, peak = [0], [0]
+
+        async def lookup(spec):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+            return {"rows": [spec["model"]]}
+
+        def replies(n, tool_choice):
+            if n == 1:
+                return {"role": "assistant", "content": None, "tool_calls": [
+                    tool_call("a", '{"lookup_spec": {"model": "Order"}}'),
+                    tool_call("b", '{"lookup_spec": {"model": "Customer"}}'),
+                ]}
+            return {"role": "assistant", "content": "Done"}
+
+        self.assertEqual(self.run_turn(replies, lookup), {"reply": "Done"})
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(self.tool_results(1), [{"rows": ["Order"]}, {"rows": ["Customer"]}])
+
+    @override_settings(CHAT_MAX_TOOL_STEPS=2)
+    def test_the_last_step_forces_a_text_answer(self):
+        async def lookup(spec):
+            return {"rows": []}
+
+        def replies(n, tool_choice):
+            if tool_choice == "none":
+                return {"role": "assistant", "content": "Giving up"}
+            return {"role": "assistant", "content": None, "tool_calls": [tool_call(f"c{n}", "{}")]}
+
+        self.assertEqual(self.run_turn(replies, lookup), {"reply": "Giving up"})
+        self.assertEqual([choice for _, choice in self.requests], ["auto", "auto", "none"])
+
+    @override_settings(CHAT_TURN_TIME_BUDGET=0.1)
+    def test_the_time_budget_cuts_off_a_slow_lookup(self):
+        async def lookup(spec):
+            await asyncio.sleep(5)
+
+        def replies(n, tool_choice):
+            if n == 1:
+                return {"role": "assistant", "content": None, "tool_calls": [tool_call("slow", "{}")]}
+            return {"role": "assistant", "content": "Too slow"}
+
+        self.assertEqual(self.run_turn(replies, lookup), {"reply": "Too slow"})
+        self.assertEqual(self.tool_results(1), [{"error": "Lookup timed out."}])
+        # The budget is spent, so the follow-up can't ask for more lookups
+        self.assertEqual(self.requests[1][1], "none")
+
+    def test_bad_arguments_go_back_to_the_model(self):
+        lookup = mock.AsyncMock()
+
+        def replies(n, tool_choice):
+            if n == 1:
+                return {"role": "assistant", "content": None, "tool_calls": [tool_call("bad", "{not json")]}
+            return {"role": "assistant", "content": "Sorry"}
+
+        self.assertEqual(self.run_turn(replies, lookup), {"reply": "Sorry"})
+        self.assertEqual(self.tool_results(1), [{"error": "Function call error: Invalid JSON arguments."}])
+        lookup.assert_not_called()
+
+
+class IntentTests(SimpleTestCase):
+    def test_the_labelled_corpus_is_parsed_exactly(self):
+        import json
+        from pathlib import Path
+        from .intents import match_intent
+        corpus = Path(__file__).resolve().parent / "intent_corpus.jsonl"
+        for line in corpus.read_text().splitlines():
+            case = json.loads(line)
+            with self.subTest(query=case["query"]):
+                match = match_intent(case["query"])
+                got = (match[0], match[1]) if match else (None, None)
+                self.assertEqual(got, (case["intent"], case["lookup_spec"]))
+
+    def test_replies_are_rendered_from_lookup_results(self):
+        from .intents import match_intent
+        _, _, render = match_intent("how many pending orders")
+        self.assertEqual(render({"rows": [{"count": 1}]}), "There is 1 pending order.")
+        self.assertEqual(render({"rows": [{"count": 3}]}), "There are 3 pending orders.")
+
+        _, _, render = match_intent("show me orders for ada")
+        row = {"id": 7, "customer__name": "Ada", "status": "pending", "created_at": "2024-05-01T10:00:00Z"}
+        reply = render({"rows": [row], "truncated": True, "total": 12})
+        self.assertEqual(reply, "Found 12 orders for 'ada', showing the latest 1:\n- Order #7 for Ada (pending, 2024-05-01)")
+        self.assertEqual(
+            render({"rows": [row], "truncated": False, "total": 1}).splitlines()[0], "Found 1 order for 'ada':"
+        )
+        reply = render({"rows": [row], "truncated": True, "total": 10000, "total_capped": True})
+        self.assertEqual(reply.splitlines()[0], "Found at least 10000 orders for 'ada', showing the latest 1:")
+        self.assertIsNone(match_intent("orders for last week"))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+        from django.utils.timezone import now
+        from django.contrib.auth.models import User
+        from .models import ChatMessage
+        cls.owner = User.objects.create_user("owner", password="secret")
+        cls.session = ChatSession.objects.create(title="Pages", user=cls.owner)
+        started = now()
+        # Pairs of messages share a timestamp, so id has to break the ties
+        cls.messages = [
+            ChatMessage.objects.create(
+                session=cls.session, role="user", content=f"message {i}", created_at=started + timedelta(seconds=i // 2)
+            )
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def test_pages_walk_every_message_newest_first(self):
+        from django.urls import reverse
+        url = f"{reverse('chat-view')}?session_id={self.session.session_id}&page_size=2&fields=id,content"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            self.assertEqual(set(response.data["results"][0]), {"id", "content"})
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, [msg.id for msg in reversed(self.messages)])
+
+    def test_a_malformed_cursor_is_not_found(self):
+        from django.urls import reverse
+        response = self.client.get(reverse("chat-view"), {"session_id": self.session.session_id, "cursor": "bm9wZQ=="})
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_sessions_are_hidden(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.client.force_login(User.objects.create_user("someone", password="secret"))
+        response = self.client.get(reverse("chat-view"), {"session_id": self.session.session_id})
+        self.assertEqual(response.data["results"], [])
+
+    def test_anonymous_sessions_belong_to_their_browser(self):
+        from django.test import Client
+        from django.urls import reverse
+        from .models import ChatMessage
+        mine, theirs = Client(), Client()
+        created = mine.post(reverse("chat-session-view"), {"title": "Mine"}).data
+        self.assertNotIn("anonymous_key", created)
+        session = ChatSession.objects.get(session_id=created["session_id"])
+        ChatMessage.objects.create(session=session, role="user", content="private")
+
+        self.assertEqual([row["title"] for row in mine.get(reverse("chat-session-view")).data["results"]], ["Mine"])
+        self.assertEqual(
+            [row["content"] for row in mine.get(reverse("chat-view"), {"session_id": session.session_id}).data["results"]],
+            ["private"]
+        )
+        # Another anonymous browser sees neither the session nor its messages
+        self.assertEqual(theirs.get(reverse("chat-session-view")).data["results"], [])
+        self.assertEqual(theirs.get(reverse("chat-view"), {"session_id": session.session_id}).data["results"], [])
+
+
+class TurnStatsTests(SimpleTestCase):
+    @override_settings(OPENAI_PRICES={"gpt-test": {"prompt": 0.5, "completion": 1.5}})
+    def test_a_turn_adds_up_its_calls_and_prices_them(self):
+        import json
+        from decimal import Decimal
+        from .accounting import TurnStats
+        stats = TurnStats()
+        stats.add_llm_call("gpt-test", 1200, 100, 0.25)
+        stats.add_tool_calls([
+            {"function": {"name": "run_sql_query", "arguments": json.dumps({"lookup_spec": {"model": "Order"}})}},
+            {"function": {"name": "run_sql_query", "arguments": json.dumps({"model": "Customer"})}},
+            {"function": {"name": "run_sql_query", "arguments": "{not json"}},
+        ], 0.04)
+        stats.add_llm_call("gpt-test", 1500, 50, 0.5)
+
+        fields = stats.message_fields()
+        self.assertEqual(
+            {key: fields[key] for key in ("llm_calls", "prompt_tokens", "completion_tokens", "used_tools", "lookup_models")},
+            {"llm_calls": 2, "prompt_tokens": 2700, "completion_tokens": 150, "used_tools": True,
+             "lookup_models": "Customer,Order"}
+        )
+        # 2700 * 0.5 / 1000 + 150 * 1.5 / 1000
+        self.assertEqual(fields["cost_usd"], Decimal("1.575000"))
+        self.assertEqual((fields["llm_latency_ms"], fields["lookup_latency_ms"]), (750, 40))
+
+    def test_unpriced_models_and_fast_path_turns_have_no_cost(self):
+        from .accounting import TurnStats, cost_of
+        self.assertIsNone(cost_of("unknown-model", 1000, 1000))
+        stats = TurnStats()
+        stats.path = "fast_path"
+        self.assertIsNone(stats.message_fields()["cost_usd"])
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+
+import tiktoken
+from django.conf import settings
+
+logger = logging.getLogger("chat.tokens")
+
+# Tokens the API adds around every chat message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+# Rough characters per token for English text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Seconds between attempts of the background loader while a download keeps failing
+LOAD_RETRY_DELAYS = (5, 30, 120, 600)
+
+# Loaded tokenizers by model. Only successful loads are kept, so a failed
+# download is tried again instead of pinning the process to estimates.
+_encodings = {}
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def load_encoding(model=None):
+    """
+    Loads the model's tokenizer and keeps it for ``get_encoding``; returns it,
+    or None if it couldn't be loaded. Blocks: tiktoken downloads its BPE file
+    unless it is already in TIKTOKEN_CACHE_DIR, so keep this off the event loop.
+    """
+    model = model or settings.OPENAI_MODEL
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # A model this tiktoken release doesn't know yet
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Tokenizer for %s unavailable, approximating token counts: %s", model, e)
+        return None
+    _encodings[model] = encoding
+    return encoding
+
+
+def preload_encoding(model=None):
+    """
+    Loads the model's tokenizer in a background thread, retrying with backoff
+    until it succeeds. Called once at server startup; returns the loading
+    thread, or None if the tokenizer is already loaded or loading.
+    """
+    model = model or settings.OPENAI_MODEL
+
+    def load():
+        for delay in LOAD_RETRY_DELAYS + (None,):
+            if load_encoding(model) is not None or delay is None:
+                break
+            time.sleep(delay)
+        with _loaders_lock:
+            _loaders.pop(model, None)
+
+    with _loaders_lock:
+        if model in _encodings or model in _loaders:
+            return None
+        thread = _loaders[model] = threading.Thread(target=load, name=f"tiktoken-{model}", daemon=True)
+        thread.start()
+    return thread
+
+
+def get_encoding(model=None):
+    """
+    The model's tokenizer if it has been loaded, else None. Never loads it,
+    so it is safe to call on the event loop.
+    """
+    return _encodings.get(model or settings.OPENAI_MODEL)
+
+
+def count_tokens(text, model=None):
+    """
+    Number of tokens ``text`` takes in a prompt, counted with the model's local tokenizer
+    (or estimated from its length while the tokenizer isn't loaded).
+    ``model`` defaults to ``OPENAI_MODEL``.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def select_within_budget(history, budget):
+    """
+    Picks the newest messages of ``history`` whose tokens fit in ``budget``.
+
+    Messages are taken newest first and the walk stops at the first one that
+    doesn't fit, so the window is always a contiguous tail of the conversation.
+    Entries are dicts with ``role``, ``content`` and a precomputed ``tokens``.
+    """
+    selected = []
+    used = 0
+    for entry in reversed(history):
+        cost = entry["tokens"] + MESSAGE_OVERHEAD
+        if used + cost > budget:
+            break
+        selected.append({"role": entry["role"], "content": entry["content"]})
+        used += cost
+    selected.reverse()
+    return selected
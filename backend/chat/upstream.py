@@ -0,0 +1,58 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import aiohttp
+import openai
+from django.conf import settings
+
+
+class UpstreamPool:
+    """
+    Shared HTTP session and concurrency limit for calls to the OpenAI API.
+
+    Every event loop gets one keep-alive ``aiohttp.ClientSession`` and one
+    semaphore, so connections are reused across chats and at most
+    ``max_concurrency`` upstream calls run at once per loop. Sessions and
+    semaphores can't be shared between loops, hence one of each per loop.
+    """
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._by_loop = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._by_loop.get(loop)
+        if state is None or state[0].closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            state = (aiohttp.ClientSession(connector=connector), asyncio.Semaphore(self.max_concurrency))
+            self._by_loop[loop] = state
+        return state
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Waits for a free upstream slot and routes openai's async requests
+        through the shared session while it is held.
+        """
+        session, semaphore = self._state()
+        async with semaphore:
+            token = openai.aiosession.set(session)
+            try:
+                yield
+            finally:
+                openai.aiosession.reset(token)
+
+    async def close(self):
+        """
+        Closes the current loop's session. Call it before the loop ends: the
+        ASGI lifespan shutdown does for the server, commands that run their
+        own loop do it themselves.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._by_loop.pop(loop, None)
+        if state is not None:
+            await state[0].close()
+
+
+upstream_pool = UpstreamPool(settings.OPENAI_MAX_CONCURRENCY)
@@ -2,7 +2,9 @@ from django.urls import path
 from .views import (
     LLMChatView,
     ChatMessageView,
-    ChatSessionListView
+    ChatSessionListView,
+    LookupCacheStatsView,
+    CoalescingStatsView
 )
 
 urlpatterns = [
@@ -10,4 +12,6 @@ urlpatterns = [
     path('llm-chat/', LLMChatView.as_view(), name='llm-chat-view'),
     path('chat/', ChatMessageView.as_view(), name='chat-view'),
     path('session/', ChatSessionListView.as_view(), name='chat-session-view'),
+    path('lookup-cache/', LookupCacheStatsView.as_view(), name='lookup-cache-view'),
+    path('coalescing/', CoalescingStatsView.as_view(), name='coalescing-view'),
 ]
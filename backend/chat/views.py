@@ -1,3 +1,4 @@
+from django.http import HttpResponse
 from rest_framework import viewsets, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -9,24 +10,60 @@ from customers.models import Customer
 
 from .models import ChatMessage, ChatSession
 from .serializers import ChatMessageSerializer, ChatSessionSerializer
+from .pagination import MessageKeysetPagination, SessionKeysetPagination
 
 from .openai_utils import process_conversation
 from .db_lookup import perform_db_lookup 
+from .lookup_cache import lookup_cache
+from .db_lookup import lookup_flight
+from .openai_utils import llm_flight
+from .metrics import render_metrics
+
+def sessions_for(request):
+    """
+    Sessions visible to a requester: their own when logged in, otherwise the
+    anonymous sessions created from the same browser session.
+    """
+    user = request.user
+    if user is not None and user.is_authenticated:
+        return ChatSession.objects.filter(user=user)
+    key = request.session.session_key
+    if not key:
+        return ChatSession.objects.none()
+    return ChatSession.objects.filter(user__isnull=True, anonymous_key=key)
+
+def anonymous_key(request):
+    """The requester's session key, starting a session (and its cookie) if there is none yet."""
+    if not request.session.session_key:
+        # An empty session is never saved, so give it something to keep
+        request.session["anonymous_chat"] = True
+        request.session.save()
+    return request.session.session_key
 
 class ChatMessageView(generics.ListAPIView):
     serializer_class = ChatMessageSerializer
+    pagination_class = MessageKeysetPagination
 
     def get_queryset(self):
         session_id = self.request.query_params.get('session_id', None)
         if not session_id:
-            return None
-        return ChatMessage.objects.filter(session__session_id= session_id).order_by("-created_at")
+            return ChatMessage.objects.none()
+        session = sessions_for(self.request).filter(session_id=session_id)
+        return ChatMessage.objects.filter(session__in=session.values("id"))
 
 class ChatSessionListView(generics.ListCreateAPIView):
     serializer_class = ChatSessionSerializer
+    pagination_class = SessionKeysetPagination
 
     def get_queryset(self):
-        return ChatSession.objects.all().order_by("-id")
+        return sessions_for(self.request)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if user.is_authenticated:
+            serializer.save(user=user)
+        else:
+            serializer.save(user=None, anonymous_key=anonymous_key(self.request))
 
 
 class LLMChatView(APIView):
@@ -46,3 +83,30 @@ class LLMChatView(APIView):
         
         return Response(result, status=status.HTTP_200_OK)
 
+
+class LookupCacheStatsView(APIView):
+    """
+    Hit and miss counters of the lookup result cache for this worker.
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(lookup_cache.stats(), status=status.HTTP_200_OK)
+
+
+class CoalescingStatsView(APIView):
+    """
+    How many lookups and LLM calls were served by joining an identical in-flight call, for this worker.
+    """
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "lookup": lookup_flight.stats(),
+            "llm": llm_flight.stats(),
+        }, status=status.HTTP_200_OK)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint: chat turn stage timings and lookup sizes,
+    merged across workers.
+    """
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
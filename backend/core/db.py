@@ -0,0 +1,16 @@
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Applies the SQLite pragmas of the sqlite profile to every new connection."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        # WAL lets reads continue while the single writer commits
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints instead of every commit; safe with WAL
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
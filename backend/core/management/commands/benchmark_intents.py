@@ -0,0 +1,64 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+import chat
+from chat.intents import match_intent
+
+DEFAULT_CORPUS = Path(chat.__file__).resolve().parent / "intent_corpus.jsonl"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Measure accuracy and latency of the fast-path intent parser on a labelled query corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="JSON lines with query, intent and lookup_spec")
+        parser.add_argument("--repeat", type=int, default=1000, help="Timing runs per query")
+        parser.add_argument("--min-accuracy", type=float, default=1.0, help="Fail below this accuracy (0-1)")
+
+    def handle(self, *args, **options):
+        with open(options["corpus"]) as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+        if not corpus:
+            raise CommandError("The corpus is empty")
+
+        correct = 0
+        false_positives = 0
+        misses = []
+        timings = []
+        for case in corpus:
+            match = match_intent(case["query"])
+            got = (match[0], match[1]) if match else (None, None)
+            if got == (case["intent"], case["lookup_spec"]):
+                correct += 1
+            else:
+                if case["intent"] is None:
+                    false_positives += 1
+                misses.append((case["query"], case["intent"], got[0]))
+
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                match_intent(case["query"])
+            timings.append((time.perf_counter() - started) / options["repeat"])
+
+        accuracy = correct / len(corpus)
+        recognized = sum(1 for case in corpus if case["intent"] is not None)
+        self.stdout.write(f"Queries: {len(corpus)} ({recognized} labelled with an intent)")
+        self.stdout.write(f"Accuracy: {accuracy:.1%}  false positives: {false_positives}")
+        self.stdout.write(
+            f"Latency per query: p50 {percentile(timings, 50) * 1e6:.1f} us  "
+            f"p99 {percentile(timings, 99) * 1e6:.1f} us"
+        )
+        for query, expected, got in misses:
+            self.stdout.write(self.style.ERROR(f"MISS {query!r}: expected {expected}, got {got}"))
+
+        if accuracy < options["min_accuracy"]:
+            raise CommandError(f"Accuracy {accuracy:.1%} is below {options['min_accuracy']:.1%}")
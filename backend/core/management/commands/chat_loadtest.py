@@ -0,0 +1,208 @@
+import json
+import time
+import asyncio
+import threading
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+DEFAULT_QUERIES = [
+    "Show me pending orders",
+    "How many orders does John have?",
+    "What is the stock of Business Cards?",
+    "List orders since 2024-01-01",
+]
+
+REPLY_TYPES = ("chat_response", "chat_done")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting the queries run on database connections.
+
+    Connections are per thread and lookups run in a thread pool, so one
+    counter is installed on every connection: those opened from now on via
+    ``connection_created`` and the calling thread's through ``install``.
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def start(self):
+        connection_created.connect(self.install, dispatch_uid=id(self))
+        # Opened before the receiver existed; the proxy resolves on the calling thread
+        self.install(connection=connection)
+
+    def stop(self):
+        connection_created.disconnect(dispatch_uid=id(self))
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class InProcessSocket:
+    """
+    Drives ChatConsumer through the ASGI application in this process.
+    """
+    def __init__(self, communicator):
+        self.communicator = communicator
+
+    @classmethod
+    async def open(cls, url):
+        from channels.testing import WebsocketCommunicator
+        from storechat.asgi import application
+
+        communicator = WebsocketCommunicator(application, "/ws/chat/")
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError("ChatConsumer refused the connection")
+        return cls(communicator)
+
+    async def send(self, payload):
+        await self.communicator.send_to(text_data=json.dumps(payload))
+
+    async def receive(self, timeout):
+        return json.loads(await self.communicator.receive_from(timeout=timeout))
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteSocket:
+    """
+    Drives a running server over a real WebSocket.
+    """
+    def __init__(self, http, ws):
+        self.http = http
+        self.ws = ws
+
+    @classmethod
+    async def open(cls, url):
+        http = aiohttp.ClientSession()
+        ws = await http.ws_connect(url)
+        return cls(http, ws)
+
+    async def send(self, payload):
+        await self.ws.send_str(json.dumps(payload))
+
+    async def receive(self, timeout):
+        return json.loads(await self.ws.receive_str(timeout=timeout))
+
+    async def close(self):
+        await self.ws.close()
+        await self.http.close()
+
+
+async def run_connection(socket_class, url, queries, turns, stream, timeout, results):
+    socket = await socket_class.open(url)
+    try:
+        session_id = (await socket.receive(timeout))["session_id"]
+        for turn in range(turns):
+            query = queries[turn % len(queries)]
+            started = time.perf_counter()
+            first_frame = None
+            await socket.send({"query": query, "session_id": session_id, "stream": stream})
+            while True:
+                frame = await socket.receive(timeout)
+                if first_frame is None:
+                    first_frame = time.perf_counter() - started
+                if frame.get("type") in REPLY_TYPES or "error" in frame:
+                    break
+            results["latency"].append(time.perf_counter() - started)
+            results["first_frame"].append(first_frame)
+    except Exception as e:
+        results["errors"].append(repr(e))
+    finally:
+        await socket.close()
+
+
+class Command(BaseCommand):
+    help = "Open N concurrent chat WebSockets, replay scripted queries and report latency and throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10)
+        parser.add_argument("--turns", type=int, default=5, help="Queries sent per connection")
+        parser.add_argument("--queries", help="File with one query per line (defaults to a built-in script)")
+        parser.add_argument("--stream", action="store_true", help="Request streamed replies")
+        parser.add_argument("--timeout", type=float, default=60)
+        parser.add_argument(
+            "--url",
+            help="ws:// URL of a running server, e.g. ws://localhost:8000/ws/chat/. "
+                 "Without it the ASGI app runs in this process and DB queries are counted."
+        )
+
+    def handle(self, *args, **options):
+        queries = DEFAULT_QUERIES
+        if options["queries"]:
+            with open(options["queries"]) as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+        results = asyncio.run(self.run(options, queries))
+        self.report(options, results)
+
+    async def run(self, options, queries):
+        results = {"latency": [], "first_frame": [], "errors": [], "queries": None}
+        socket_class = RemoteSocket if options["url"] else InProcessSocket
+
+        counter = QueryCounter()
+        if socket_class is InProcessSocket:
+            # Also covers the shared sync thread, whose connection may already be open
+            await sync_to_async(counter.start)()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            run_connection(
+                socket_class, options["url"], queries, options["turns"],
+                options["stream"], options["timeout"], results
+            )
+            for _ in range(options["connections"])
+        ])
+        results["elapsed"] = time.perf_counter() - started
+
+        if socket_class is InProcessSocket:
+            from chat.message_writer import message_writer
+            from chat.upstream import upstream_pool
+            await message_writer.flush()
+            await upstream_pool.close()
+            counter.stop()
+            results["queries"] = counter.count
+        return results
+
+    def report(self, options, results):
+        latency = results["latency"]
+        first_frame = results["first_frame"]
+        turns = len(latency)
+
+        self.stdout.write(f"Connections: {options['connections']}  turns completed: {turns}  "
+                          f"errors: {len(results['errors'])}  wall time: {results['elapsed']:.2f}s")
+        self.stdout.write(f"Messages/s: {turns / results['elapsed']:.2f}")
+        for label, values in (("End-to-end", latency), ("First frame", first_frame)):
+            self.stdout.write(
+                f"{label:<12} p50 {percentile(values, 50) * 1000:8.1f} ms  "
+                f"p95 {percentile(values, 95) * 1000:8.1f} ms  "
+                f"p99 {percentile(values, 99) * 1000:8.1f} ms"
+            )
+        if results["queries"] is not None:
+            per_turn = results["queries"] / turns if turns else 0
+            self.stdout.write(f"DB queries: {results['queries']} ({per_turn:.1f} per turn)")
+        else:
+            self.stdout.write("DB queries: n/a against a remote server")
+        for error in results["errors"][:5]:
+            self.stdout.write(self.style.ERROR(error))
@@ -0,0 +1,103 @@
+import json
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from chat.models import ChatMessage
+
+GROUPINGS = ("day", "model", "lookup_model", "path")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def group_keys(row, by):
+    created_at, llm_model, lookup_models, answer_path = row[:4]
+    if by == "day":
+        return [created_at.date().isoformat()]
+    if by == "model":
+        return [llm_model or "(none)"]
+    if by == "lookup_model":
+        # A turn that queried several models counts towards each of them
+        return lookup_models.split(",") if lookup_models else ["(none)"]
+    return [answer_path]
+
+
+class Command(BaseCommand):
+    help = "Token, latency and cost percentiles of assistant replies, per day, LLM model, lookup model or answer path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Only replies from the last N days")
+        parser.add_argument("--by", choices=GROUPINGS, default="day")
+        parser.add_argument("--json", action="store_true", help="Print one JSON object per group")
+
+    def handle(self, *args, **options):
+        by = options["by"]
+        rows = (
+            ChatMessage.objects
+            .filter(role="assistant", created_at__gte=now() - timedelta(days=options["days"]))
+            .exclude(answer_path="")
+            .values_list(
+                "created_at", "llm_model", "lookup_models", "answer_path", "prompt_tokens",
+                "completion_tokens", "cost_usd", "llm_latency_ms", "lookup_latency_ms", "used_tools"
+            )
+        )
+
+        groups = defaultdict(lambda: {"tokens": [], "llm_ms": [], "lookup_ms": [], "cost": Decimal(0), "tools": 0})
+        for row in rows.iterator(chunk_size=2000):
+            prompt_tokens, completion_tokens, cost, llm_ms, lookup_ms, used_tools = row[4:]
+            for key in group_keys(row, by):
+                group = groups[key]
+                group["tokens"].append((prompt_tokens or 0) + (completion_tokens or 0))
+                group["llm_ms"].append(llm_ms or 0)
+                group["lookup_ms"].append(lookup_ms or 0)
+                group["cost"] += cost or 0
+                group["tools"] += used_tools
+
+        report = []
+        for key in sorted(groups):
+            group = groups[key]
+            turns = len(group["tokens"])
+            report.append({
+                by: key,
+                "turns": turns,
+                "tool_turns": group["tools"],
+                "tokens_p50": percentile(group["tokens"], 50),
+                "tokens_p95": percentile(group["tokens"], 95),
+                "llm_ms_p50": percentile(group["llm_ms"], 50),
+                "llm_ms_p95": percentile(group["llm_ms"], 95),
+                "lookup_ms_p50": percentile(group["lookup_ms"], 50),
+                "lookup_ms_p95": percentile(group["lookup_ms"], 95),
+                "cost_usd": str(group["cost"]),
+                "cost_usd_per_turn": str((group["cost"] / turns).quantize(Decimal("0.000001"))),
+            })
+
+        if options["json"]:
+            for entry in report:
+                self.stdout.write(json.dumps(entry))
+            return
+        if not report:
+            self.stdout.write("No assistant replies with accounting in this period")
+            return
+
+        self.stdout.write(
+            f"{by:<16} {'turns':>7} {'tools':>7} {'tok p50':>8} {'tok p95':>8} "
+            f"{'llm p50':>8} {'llm p95':>8} {'lkp p50':>8} {'lkp p95':>8} {'cost $':>11} {'$/turn':>10}"
+        )
+        for entry in report:
+            self.stdout.write(
+                f"{entry[by]:<16} {entry['turns']:>7} {entry['tool_turns']:>7} "
+                f"{entry['tokens_p50']:>8} {entry['tokens_p95']:>8} "
+                f"{entry['llm_ms_p50']:>8} {entry['llm_ms_p95']:>8} "
+                f"{entry['lookup_ms_p50']:>8} {entry['lookup_ms_p95']:>8} "
+                f"{entry['cost_usd']:>11} {entry['cost_usd_per_turn']:>10}"
+            )
+        self.stdout.write("Latencies in ms; cost of fast-path replies is zero")
@@ -0,0 +1,157 @@
+import os
+import sys
+import argparse
+import json
+import time
+import random
+import asyncio
+import subprocess
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.models import Customer
+from products.models import Product
+
+STATUSES = ["pending", "processing", "completed", "cancelled"]
+
+# Fast-path query shapes: a full chat turn of database work without the LLM
+QUERY_TEMPLATES = [
+    "show me orders for {customer}",
+    "how many {status} orders",
+    "what is the stock of {product}",
+    "{status} orders",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_queries(count, rng):
+    customers = list(Customer.objects.order_by("?").values_list("name", flat=True)[:200])
+    products = list(Product.objects.order_by("?").values_list("name", flat=True)[:200])
+    if not customers or not products:
+        raise CommandError("Seed the database first, e.g. manage.py seed --customers 1000 --products 100 --orders 10000")
+    return [
+        rng.choice(QUERY_TEMPLATES).format(
+            customer=rng.choice(customers), product=rng.choice(products), status=rng.choice(STATUSES)
+        )
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare chat-turn throughput across database profiles. Each profile runs in "
+        "its own process; turns use the fast path, so no LLM is called."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles", default=None,
+            help="Comma-separated DB_ENGINE values to compare, e.g. sqlite,postgresql "
+                 "(default: the current profile only). Each needs migrated, seeded data."
+        )
+        parser.add_argument("--sessions", type=int, default=20, help="Concurrent chat sessions")
+        parser.add_argument("--turns", type=int, default=10, help="Turns per session")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            result = asyncio.run(self.run_turns(options))
+            self.stdout.write(json.dumps(result))
+            return
+
+        profiles = (options["profiles"] or settings.DB_ENGINE).split(",")
+        results = [self.run_profile(profile.strip(), options) for profile in profiles]
+        self.report(results)
+
+    def run_profile(self, profile, options):
+        self.stdout.write(f"Running {options['sessions']} sessions x {options['turns']} turns on {profile}...")
+        env = dict(
+            os.environ,
+            DB_ENGINE=profile,
+            CHAT_FAST_PATH="True",
+            # Keep lookups on the database rather than the result cache
+            LOOKUP_CACHE_BACKEND="memory",
+            LOOKUP_CACHE_MAX_ENTRIES="0",
+        )
+        command = [
+            sys.executable, sys.argv[0], "db_benchmark", "--worker",
+            "--sessions", str(options["sessions"]), "--turns", str(options["turns"]), "--seed", str(options["seed"]),
+        ]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"profile": profile, "failed": completed.stderr.strip().splitlines()[-1:] or ["unknown error"]}
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    async def run_turns(self, options):
+        from chat.message_writer import message_writer
+        from chat.models import ChatMessage, ChatSession
+        from chat.openai_utils import process_conversation
+        from chat.upstream import upstream_pool
+
+        rng = random.Random(options["seed"])
+        queries = await sync_to_async(build_queries)(options["sessions"] * options["turns"], rng)
+        sessions = [
+            await sync_to_async(ChatSession.objects.create)(title="db_benchmark")
+            for _ in range(options["sessions"])
+        ]
+        latencies = []
+        errors = []
+
+        async def run_session(index, session):
+            for turn in range(options["turns"]):
+                query = queries[index * options["turns"] + turn]
+                started = time.perf_counter()
+                # Loads the session and history, runs the lookup and queues both messages
+                response = await process_conversation(query, str(session.session_id))
+                # Write them now rather than after the flush interval, so each turn
+                # includes its share of the database's write load
+                await message_writer.flush()
+                latencies.append(time.perf_counter() - started)
+                if "error" in response or response.get("reply", "").startswith("Something went wrong"):
+                    errors.append(query)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[run_session(index, session) for index, session in enumerate(sessions)])
+        await message_writer.flush()
+        elapsed = time.perf_counter() - started
+        await upstream_pool.close()
+
+        messages = await sync_to_async(ChatMessage.objects.filter(session__in=sessions).count)()
+        # Leave the benchmark's sessions (and their messages) out of the real data
+        await sync_to_async(ChatSession.objects.filter(pk__in=[s.pk for s in sessions]).delete)()
+        return {
+            "profile": settings.DB_ENGINE,
+            "turns": len(latencies),
+            "messages": messages,
+            "errors": len(errors),
+            "elapsed": elapsed,
+            "turns_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'profile':<12} {'turns':>7} {'errors':>7} {'messages':>9} {'turns/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for result in results:
+            if "failed" in result:
+                self.stdout.write(self.style.ERROR(f"{result['profile']:<12} failed: {result['failed'][0]}"))
+                continue
+            self.stdout.write(
+                f"{result['profile']:<12} {result['turns']:>7} {result['errors']:>7} {result['messages']:>9} "
+                f"{result['turns_per_second']:>9.1f} {result['p50_ms']:>9.1f} "
+                f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+            )
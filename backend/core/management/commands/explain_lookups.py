@@ -0,0 +1,107 @@
+import re
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import now
+
+from chat.models import ChatMessage
+from customers.models import Customer
+from orders.models import Order
+
+# Plan fragments that mean an index is used / a table is read in full.
+# SQLite: "SEARCH t USING INDEX i", "SCAN t", "SCAN t_fts VIRTUAL TABLE INDEX 0:M1"
+# (an FTS5 MATCH). PostgreSQL: "Index Scan", "Seq Scan".
+INDEX_RE = re.compile(
+    r"USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY|VIRTUAL TABLE INDEX \d+:M|"
+    r"Index Scan|Index Only Scan|Bitmap Index Scan"
+)
+SCAN_RE = re.compile(r"\bSCAN \w+$|\bSCAN \w+ \(|Seq Scan", re.MULTILINE)
+
+
+def lookup_shapes():
+    """
+    The query shapes the chat hot path and LLM lookups run, with whether an
+    index is expected to serve them.
+    """
+    since = now() - timedelta(days=7)
+    return [
+        ("chat history window", True,
+         ChatMessage.objects.filter(session_id=1).order_by("-created_at")[:10]),
+        ("chat view by session_id", True,
+         ChatMessage.objects.filter(session__session_id=uuid.uuid4()).order_by("-created_at")),
+        ("orders by status", True,
+         Order.objects.filter(status="pending")),
+        ("orders by status and date range", True,
+         Order.objects.filter(status="pending", created_at__gte=since)),
+        ("orders by date range", True,
+         Order.objects.filter(created_at__gte=since)),
+        ("customer name search (trigram index)", connection.vendor in ("sqlite", "postgresql"),
+         customer_search("john")),
+        # What a "search" lookup replaces; LIKE '%x%' can't use a B-tree index
+        ("orders by customer name substring", False,
+         Order.objects.filter(customer__name__icontains="john")),
+    ]
+
+
+def customer_search(term):
+    """The candidate query chat.search runs against the customer name index."""
+    if connection.vendor == "postgresql":
+        return Customer.objects.filter(name__trigram_word_similar=term)
+    if connection.vendor == "sqlite":
+        return (
+            "SELECT rowid FROM customers_customer_fts WHERE customers_customer_fts MATCH %s ORDER BY rank",
+            [term],
+        )
+    return Customer.objects.filter(name__icontains=term)
+
+
+def explain(query):
+    """The plan of a queryset, or of a raw ``(sql, params)`` query."""
+    if not isinstance(query, tuple):
+        return query.explain()
+    sql, params = query
+    prefix = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", params)
+        # SQLite rows are (id, parent, notused, detail); PostgreSQL rows are one line each
+        return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the standard lookup shapes and report whether each uses an index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the full plan of every query")
+        parser.add_argument(
+            "--force-index",
+            action="store_true",
+            help="PostgreSQL only: disable sequential scans so small databases still show usable indexes"
+        )
+
+    def handle(self, *args, **options):
+        if options["force_index"] and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        regressions = []
+        for label, expect_index, query in lookup_shapes():
+            plan = explain(query)
+            uses_index = bool(INDEX_RE.search(plan)) and not SCAN_RE.search(plan)
+
+            if uses_index:
+                verdict = self.style.SUCCESS("index")
+            elif expect_index:
+                verdict = self.style.ERROR("full scan")
+                regressions.append(label)
+            else:
+                verdict = self.style.WARNING("full scan (expected)")
+
+            self.stdout.write(f"{label:<45} {verdict}")
+            if options["verbose_plans"]:
+                self.stdout.write(f"    {plan}".replace("\n", "\n    "))
+
+        if regressions:
+            raise CommandError(f"Lookups not using an index: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("All indexed lookup shapes use an index"))
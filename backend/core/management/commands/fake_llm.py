@@ -0,0 +1,126 @@
+import json
+import time
+import uuid
+import asyncio
+
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+DEFAULT_LOOKUP = {"model": "Order", "filters": {"status": "pending"}, "fields": ["id", "customer__name", "status"]}
+DEFAULT_ANSWER = "Here are the orders you asked about. Everything looks on track and nothing needs attention right now."
+
+
+def build_app(latency, tokens_per_second, lookup_specs, answer):
+    """
+    A stand-in for the ChatCompletions endpoint.
+
+    The first call of a turn (last message from the user) asks for one
+    ``run_sql_query`` tool call per entry of ``lookup_specs`` when tools
+    are offered; the call after the tool results answers with ``answer``.
+    Replies wait ``latency`` seconds, and streamed replies send
+    ``tokens_per_second`` tokens.
+    """
+    tokens = [word + " " for word in answer.split()]
+    tool_calls = [
+        {
+            "id": f"call_{index}",
+            "type": "function",
+            "function": {"name": "run_sql_query", "arguments": json.dumps({"lookup_spec": spec})},
+        }
+        for index, spec in enumerate(lookup_specs)
+    ]
+
+    def completion(body, message, finish_reason):
+        prompt_tokens = sum(len(str(msg.get("content") or "").split()) for msg in body["messages"])
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        }
+
+    def chunk(body, delta, finish_reason=None):
+        payload = {
+            "id": "chatcmpl-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload)}\n\n".encode()
+
+    async def chat_completions(request):
+        body = await request.json()
+        wants_tools = (
+            bool(body.get("tools"))
+            and body.get("tool_choice") != "none"
+            and body["messages"][-1]["role"] == "user"
+        )
+        await asyncio.sleep(latency)
+
+        if wants_tools:
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": "".join(tokens).strip()}
+            finish_reason = "stop"
+
+        if not body.get("stream"):
+            return web.json_response(completion(body, message, finish_reason))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        if wants_tools:
+            deltas = [dict(call, index=index) for index, call in enumerate(tool_calls)]
+            await response.write(chunk(body, {"role": "assistant", "tool_calls": deltas}))
+        else:
+            for token in tokens:
+                await response.write(chunk(body, {"content": token}))
+                if tokens_per_second:
+                    await asyncio.sleep(1 / tokens_per_second)
+        await response.write(chunk(body, {}, finish_reason))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+class Command(BaseCommand):
+    help = "Run a local fake of the OpenAI ChatCompletions endpoint for load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument("--latency", type=float, default=0.5, help="Seconds before a reply starts")
+        parser.add_argument("--tokens-per-second", type=float, default=50, help="Streaming rate, 0 for no delay")
+        parser.add_argument(
+            "--lookup",
+            default=json.dumps(DEFAULT_LOOKUP),
+            help="lookup_spec JSON to request, or a JSON list of them for parallel lookups"
+        )
+        parser.add_argument("--answer", default=DEFAULT_ANSWER, help="Final answer text")
+
+    def handle(self, *args, **options):
+        lookup_specs = json.loads(options["lookup"])
+        if isinstance(lookup_specs, dict):
+            lookup_specs = [lookup_specs]
+        app = build_app(
+            options["latency"],
+            options["tokens_per_second"],
+            lookup_specs,
+            options["answer"]
+        )
+        self.stdout.write(
+            f"Fake LLM listening on http://{options['host']}:{options['port']}/v1 "
+            f"(set OPENAI_API_BASE to this URL)"
+        )
+        web.run_app(app, host=options["host"], port=options["port"], print=None)
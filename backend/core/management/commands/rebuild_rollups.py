@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import DailyOrderStats, DailyProductSales
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily order and product sales rollups from scratch"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding rollups...")
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups rebuilt: {DailyOrderStats.objects.count()} order stats rows, "
+            f"{DailyProductSales.objects.count()} product sales rows"
+        ))
@@ -1,12 +1,79 @@
+import io
+import csv
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.timezone import now
 from customers.models import Customer
 from products.models import Product
 from orders.models import Order, OrderItem
 
+FIRST_NAMES = ["John", "Jane", "Alex", "Maria", "Wei", "Priya", "Omar", "Sofia", "Liam", "Aiko", "Carlos", "Fatima"]
+LAST_NAMES = ["Doe", "Smith", "Garcia", "Chen", "Patel", "Khan", "Rossi", "Muller", "Tanaka", "Silva", "Brown", "Novak"]
+CATEGORIES = ["Stationery", "Print", "Signage", "Packaging", "Apparel", "Promotional"]
+PRODUCT_NOUNS = ["Business Cards", "Flyers", "Posters", "Banners", "Stickers", "Brochures", "Mugs", "T-Shirts", "Labels"]
+PRODUCT_STYLES = ["Classic", "Premium", "Matte", "Glossy", "Eco", "Deluxe", "Mini", "Large"]
+
+# Recent orders are still in flight, older ones are mostly done
+RECENT_STATUSES = (["pending", "processing", "cancelled"], [50, 40, 10])
+OLD_STATUSES = (["completed", "cancelled", "pending", "processing"], [85, 10, 3, 2])
+RECENT_DAYS = 3
+
+
+def parse_count(value):
+    """Accepts plain or scientific notation, e.g. 5e6."""
+    return int(float(value))
+
+
+class BulkLoader:
+    """Inserts rows with bulk_create."""
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def load(self, Model, columns, rows):
+        Model.objects.bulk_create(
+            [Model(**dict(zip(columns, row))) for row in rows],
+            batch_size=self.batch_size
+        )
+
+
+class CopyLoader:
+    """Streams rows as CSV into PostgreSQL's COPY."""
+    def load(self, Model, columns, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {Model._meta.db_table} ({", ".join(columns)}) FROM STDIN WITH CSV',
+                buffer
+            )
+
+
 class Command(BaseCommand):
-    help = "Seed the database with sample data"
+    help = "Seed the database with sample data, or with a large synthetic dataset when sizes are given"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=parse_count, default=0)
+        parser.add_argument("--products", type=parse_count, default=0)
+        parser.add_argument("--orders", type=parse_count, default=0)
+        parser.add_argument("--seed", type=int, default=42, help="Random seed, same seed gives the same data")
+        parser.add_argument("--days", type=int, default=730, help="Orders are spread over this many past days")
+        parser.add_argument("--batch-size", type=parse_count, default=10000)
 
     def handle(self, *args, **options):
+        if options["customers"] or options["products"] or options["orders"]:
+            self.seed_synthetic(options)
+        else:
+            self.seed_samples()
+
+    def seed_samples(self):
         self.stdout.write("Seeding data...")
 
         # Create sample customers
@@ -62,3 +129,107 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS("Database seeded successfully"))
 
+    def seed_synthetic(self, options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        loader = CopyLoader() if connection.vendor == "postgresql" else BulkLoader(batch_size)
+        # Anchor dates to the start of today so reruns on the same day match
+        end = now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # created_at is auto_now_add; switch that off so generated dates are kept
+        auto_fields = [Customer._meta.get_field("created_at"), Order._meta.get_field("created_at")]
+        for field in auto_fields:
+            field.auto_now_add = False
+        try:
+            customer_ids = self.seed_customers(rng, loader, options["customers"], batch_size, end, options["days"])
+            products = self.seed_products(rng, loader, options["products"], batch_size)
+            self.seed_orders(rng, loader, options["orders"], batch_size, end, options["days"], customer_ids, products)
+        finally:
+            for field in auto_fields:
+                field.auto_now_add = True
+
+        # Rows were inserted with explicit ids; move the sequences past them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Customer, Product, Order, OrderItem]):
+                cursor.execute(sql)
+
+        # bulk_create and COPY skip the signals that keep rollups current
+        call_command("rebuild_rollups", stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS("Synthetic data seeded successfully"))
+
+    def next_id(self, Model):
+        return (Model.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+
+    def seed_customers(self, rng, loader, count, batch_size, end, days):
+        start_id = self.next_id(Customer)
+        columns = ["id", "name", "email", "phone", "created_at"]
+        for offset in range(0, count, batch_size):
+            rows = []
+            for i in range(start_id + offset, start_id + min(offset + batch_size, count)):
+                name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                created_at = end - timedelta(seconds=rng.randrange(days * 86400))
+                rows.append((i, name, f"customer{i}@example.com", f"+1{i:012d}", created_at))
+            with transaction.atomic():
+                loader.load(Customer, columns, rows)
+            self.stdout.write(f"Customers: {offset + len(rows)}/{count}")
+        return range(start_id, start_id + count)
+
+    def seed_products(self, rng, loader, count, batch_size):
+        start_id = self.next_id(Product)
+        columns = ["id", "name", "description", "category", "price", "stock_quantity"]
+        prices = {}
+        for offset in range(0, count, batch_size):
+            rows = []
+            for i in range(start_id + offset, start_id + min(offset + batch_size, count)):
+                noun = rng.choice(PRODUCT_NOUNS)
+                name = f"{rng.choice(PRODUCT_STYLES)} {noun} {i}"
+                price = Decimal(rng.randint(199, 19999)) / 100
+                prices[i] = price
+                rows.append((i, name, f"{name} for every occasion.", rng.choice(CATEGORIES), price, rng.randint(0, 1000)))
+            with transaction.atomic():
+                loader.load(Product, columns, rows)
+            self.stdout.write(f"Products: {offset + len(rows)}/{count}")
+        return prices
+
+    def seed_orders(self, rng, loader, count, batch_size, end, days, customer_ids, products):
+        if not count:
+            return
+        # Fall back to existing rows when only orders are requested
+        if not customer_ids:
+            customer_ids = list(Customer.objects.values_list("id", flat=True))
+        if not products:
+            products = dict(Product.objects.values_list("id", "price"))
+        if not customer_ids or not products:
+            self.stdout.write(self.style.ERROR("Orders need at least one customer and one product"))
+            return
+
+        # Skewed popularity: the product at rank r is picked with weight 1 / r^1.1
+        product_ids = list(products)
+        cum_weights = []
+        total = 0.0
+        for rank in range(1, len(product_ids) + 1):
+            total += 1 / rank ** 1.1
+            cum_weights.append(total)
+
+        order_id = self.next_id(Order)
+        item_id = self.next_id(OrderItem)
+        order_columns = ["id", "customer_id", "status", "created_at"]
+        item_columns = ["id", "order_id", "product_id", "quantity", "price"]
+        for offset in range(0, count, batch_size):
+            orders, items = [], []
+            for _ in range(min(batch_size, count - offset)):
+                age = rng.randrange(days * 86400)
+                statuses, weights = RECENT_STATUSES if age < RECENT_DAYS * 86400 else OLD_STATUSES
+                status = rng.choices(statuses, weights)[0]
+                orders.append((order_id, rng.choice(customer_ids), status, end - timedelta(seconds=age)))
+
+                for product_id in rng.choices(product_ids, cum_weights=cum_weights, k=rng.randint(1, 4)):
+                    items.append((item_id, order_id, product_id, rng.randint(1, 20), products[product_id]))
+                    item_id += 1
+                order_id += 1
+
+            with transaction.atomic():
+                loader.load(Order, order_columns, orders)
+                loader.load(OrderItem, item_columns, items)
+            self.stdout.write(f"Orders: {offset + len(orders)}/{count}")
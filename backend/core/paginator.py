@@ -0,0 +1,61 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def table_estimate(model, using):
+    """Row count the database keeps in its statistics, or None without one."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            # -1 means the table was never analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == "sqlite":
+            # Filled by ANALYZE; the first number of any entry is the table's row count
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+def plan_estimate(queryset):
+    """Rows the PostgreSQL planner expects a filtered queryset to return."""
+    plan = json.loads(queryset.explain(format="json"))
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan["Plan"]["Plan Rows"])
+
+
+def estimate_count(queryset):
+    try:
+        if not queryset.query.where:
+            return table_estimate(queryset.model, queryset.db)
+        if connections[queryset.db].vendor == "postgresql":
+            return plan_estimate(queryset.order_by())
+    except (DatabaseError, KeyError, ValueError, TypeError):
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to ADMIN_EXACT_COUNT_LIMIT rows and trusts the
+    database's estimate beyond that, so a changelist page doesn't wait on
+    a COUNT(*) over the whole table. Page links past the real end simply
+    come back empty.
+    """
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        # Reads at most limit + 1 rows, however big the table
+        exact = queryset.order_by()[:limit + 1].count()
+        if exact <= limit:
+            return exact
+        return max(estimate_count(queryset) or 0, exact)
@@ -1,3 +1,80 @@
-from django.test import TestCase
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from customers.models import Customer
+from .management.commands.chat_loadtest import QueryCounter
+from .paginator import EstimatedCountPaginator
+
+
+class QueryCounterTests(TransactionTestCase):
+    def test_counts_queries_from_every_thread(self):
+        counter = QueryCounter()
+
+        async def run():
+            await sync_to_async(counter.start)()
+            # The shared sync thread, then a pool thread with its own connection
+            await sync_to_async(Customer.objects.count)()
+            await sync_to_async(Customer.objects.count, thread_sensitive=False)()
+            counter.stop()
+
+        asyncio.run(run())
+        self.assertGreaterEqual(counter.count, 2)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite profile only")
+class SQLitePragmaTests(SimpleTestCase):
+    @override_settings(SQLITE_BUSY_TIMEOUT=2.5, SQLITE_CACHE_SIZE_KB=1024)
+    def test_new_connections_are_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A file database: in-memory ones can't use WAL
+            settings_dict = dict(connection.settings_dict, NAME=str(Path(directory) / "pragmas.sqlite3"))
+            wrapper = type(connections["default"])(settings_dict, alias="pragma_test")
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store"):
+                        cursor.execute(f"PRAGMA {name}")
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+
+        # synchronous 1 is NORMAL, temp_store 2 is MEMORY
+        self.assertEqual(
+            pragmas,
+            {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 2500, "cache_size": -1024, "temp_store": 2}
+        )
+
+
+@override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Customer.objects.create(name=f"Customer {i}", email=f"c{i}@example.com", phone=f"555010{i}")
+
+    def count(self, queryset):
+        return EstimatedCountPaginator(queryset.order_by("-id"), 2).count
+
+    def test_small_results_are_counted_exactly(self):
+        self.assertEqual(self.count(Customer.objects.filter(name="Customer 1")), 1)
+
+    def test_large_tables_use_the_statistics(self):
+        # Without statistics the count stops just past the limit
+        self.assertEqual(self.count(Customer.objects.all()), 4)
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            self.assertEqual(self.count(Customer.objects.all()), 5)
+
+    def test_admin_changelist_uses_it(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser("admin", password="secret"))
+        response = self.client.get("/admin/orders/order/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.context["cl"].paginator, EstimatedCountPaginator)
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='customer_name_upper_idx'),
+        ),
+    ]
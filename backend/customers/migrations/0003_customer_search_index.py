@@ -0,0 +1,51 @@
+# Generated by Django 4.1 on 2026-10-18 12:05
+
+from django.db import migrations
+
+# SQLite: an FTS5 trigram table kept in sync with triggers, so bulk loads
+# are indexed too. PostgreSQL: a pg_trgm GIN index on the column itself.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE customers_customer_fts USING fts5(name, tokenize='trigram')",
+    "INSERT INTO customers_customer_fts(rowid, name) SELECT id, name FROM customers_customer",
+    "CREATE TRIGGER customers_customer_fts_ai AFTER INSERT ON customers_customer BEGIN "
+    "INSERT INTO customers_customer_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER customers_customer_fts_ad AFTER DELETE ON customers_customer BEGIN "
+    "DELETE FROM customers_customer_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER customers_customer_fts_au AFTER UPDATE ON customers_customer BEGIN "
+    "UPDATE customers_customer_fts SET rowid = new.id, name = new.name WHERE rowid = old.id; END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS customers_customer_fts_ai",
+    "DROP TRIGGER IF EXISTS customers_customer_fts_ad",
+    "DROP TRIGGER IF EXISTS customers_customer_fts_au",
+    "DROP TABLE IF EXISTS customers_customer_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS customer_name_trgm_idx ON customers_customer USING gin (name gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS customer_name_trgm_idx",
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        # Other backends fall back to substring matching in chat.search
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_customer_name_upper_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRES_REVERSE}),
+        ),
+    ]
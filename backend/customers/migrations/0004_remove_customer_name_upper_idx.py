@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 08:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_search_index'),
+    ]
+
+    # Name lookups are substring matches (LIKE '%x%', and iexact is LIKE on
+    # SQLite too), which UPPER(name) never served; the trigram index from 0003 does
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_name_upper_idx',
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 
 class Customer(models.Model):
+    # Name lookups go through the trigram search index created in
+    # migrations/0003_customer_search_index.py (see chat.search); a B-tree
+    # index can't serve the substring and case-insensitive matches they need.
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, unique=True)
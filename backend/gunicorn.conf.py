@@ -0,0 +1,6 @@
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Stop merging the metrics files of workers that are gone
+    multiprocess.mark_process_dead(worker.pid)
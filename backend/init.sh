@@ -19,5 +19,9 @@ EOF
 
 export DJANGO_SETTINGS_MODULE=storechat.settings
 
+# Workers write their metrics here so /metrics covers all of them
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/storechat_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Starting ASGI server with Gunicorn and UvicornWorker..."
 exec gunicorn --bind 0.0.0.0:8000 storechat.asgi:application -k uvicorn.workers.UvicornWorker
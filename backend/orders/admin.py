@@ -1,9 +1,21 @@
 from django.contrib import admin
+from core.paginator import EstimatedCountPaginator
 from .models import Order, OrderItem
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'requested_by', 'status', 'created_at')
+    list_select_related = ('customer', 'requested_by')
+    # Both filters are served by order_status_created_idx / order_created_idx
+    list_filter = ('status', 'created_at')
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-admin.site.register(Order, OrderAdmin)
-admin.site.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order__customer', 'product')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+admin.site.register(Order, OrderAdmin)
+admin.site.register(OrderItem, OrderItemAdmin)
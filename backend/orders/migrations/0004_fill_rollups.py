@@ -0,0 +1,20 @@
+# Generated by Django 4.1 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+def fill_rollups(apps, schema_editor):
+    # Orders created before 0003 have no rollup rows; the signals only track changes
+    from orders.rollups import rebuild_rollups
+    rebuild_rollups(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_dailyorderstats_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -22,6 +22,12 @@ class Order(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
 
@@ -32,5 +38,40 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} (Order {self.order.id})"
+        return f"{self.quantity} x {self.product.name} (Order {self.order_id})"
+
+
+class DailyOrderStats(models.Model):
+    """
+    Number of orders per creation day and status, kept up to date by signals
+    (see orders/rollups.py).
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_order_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count}"
+
+class DailyProductSales(models.Model):
+    """
+    Quantity sold and revenue per product and order day, kept up to date by
+    signals (see orders/rollups.py).
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.quantity}"
@@ -1,6 +1,13 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
 
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'product_name', 'quantity', 'price']
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     # Optionally, include a read-only representation for the related user
@@ -10,3 +17,15 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Flat, one row per order; ``item_count`` and ``total`` are annotated
+    by the summary queryset instead of loading the items.
+    """
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    total = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'customer', 'customer_name', 'status', 'created_at', 'item_count', 'total']
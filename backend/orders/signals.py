@@ -0,0 +1,62 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import DailyOrderStats, DailyProductSales, Order, OrderItem
+from .rollups import bump, item_amounts, item_key, negate, order_key
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_key(sender, instance, **kwargs):
+    # The row as it is in the database, so a status change can move the count
+    instance._rollup_old = None
+    if instance.pk:
+        old = Order.objects.filter(pk=instance.pk).values("created_at", "status").first()
+        if old:
+            instance._rollup_old = order_key(Order(**old))
+
+
+@receiver(post_save, sender=Order)
+def update_order_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_key, new_key = getattr(instance, "_rollup_old", None), order_key(instance)
+    if old_key == new_key:
+        return
+    if old_key:
+        bump(DailyOrderStats, old_key, order_count=-1)
+    bump(DailyOrderStats, new_key, order_count=1)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_stats(sender, instance, **kwargs):
+    bump(DailyOrderStats, order_key(instance), order_count=-1)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_amounts(sender, instance, **kwargs):
+    instance._rollup_old = None
+    if instance.pk:
+        old = OrderItem.objects.filter(pk=instance.pk).select_related("order").first()
+        if old:
+            instance._rollup_old = (item_key(old, old.order.created_at), item_amounts(old))
+
+
+@receiver(post_save, sender=OrderItem)
+def update_product_sales(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_rollup_old", None)
+    if old:
+        bump(DailyProductSales, old[0], **negate(old[1]))
+    bump(DailyProductSales, item_key(instance, instance.order.created_at), **item_amounts(instance))
+
+
+@receiver(pre_delete, sender=OrderItem)
+def remember_deleted_item(sender, instance, **kwargs):
+    # The order may be deleted in the same cascade, so read its date while it exists
+    instance._rollup_key = item_key(instance, instance.order.created_at)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_product_sales(sender, instance, **kwargs):
+    bump(DailyProductSales, instance._rollup_key, **negate(item_amounts(instance)))
@@ -1,3 +1,142 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from customers.models import Customer
+from products.models import Product
+from .models import DailyOrderStats, DailyProductSales, Order, OrderItem
+from .rollups import rebuild_rollups
+
+
+class OrderListQueryCountTests(TestCase):
+    # Authenticates without loading a session, so only the view's queries are counted
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("staff", password="secret", is_staff=True)
+        cls.products = [
+            Product.objects.create(name=f"Product {i}", category="Print", price=Decimal("2.50"), stock_quantity=10)
+            for i in range(3)
+        ]
+        cls.customers = [
+            Customer.objects.create(name=f"Customer {i}", email=f"c{i}@example.com", phone=f"555000{i}")
+            for i in range(3)
+        ]
+        cls.add_orders(6)
+
+    @classmethod
+    def add_orders(cls, count):
+        for i in range(count):
+            order = Order.objects.create(customer=cls.customers[i % 3], requested_by=cls.user)
+            for product in cls.products:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_is_fixed(self):
+        # Orders with customer and user, then the page's items with products
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("order-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 6)
+        first = response.data["results"][0]
+        self.assertEqual(first["requested_by"], "staff")
+        self.assertEqual(len(first["items"]), 3)
+        self.assertEqual(first["items"][0]["product_name"].split()[0], "Product")
+
+        self.add_orders(10)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("order-list"), {"page_size": 16})
+        self.assertEqual(len(response.data["results"]), 16)
+
+    def test_list_is_paginated(self):
+        response = self.client.get(reverse("order-list"), {"page_size": 4})
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+    def test_summary_is_flat_and_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("order-summary"))
+        self.assertEqual(response.status_code, 200)
+        row = response.data["results"][0]
+        self.assertNotIn("items", row)
+        self.assertEqual(row["item_count"], 3)
+        self.assertEqual(Decimal(row["total"]), Decimal("15.00"))
+        self.assertTrue(row["customer_name"].startswith("Customer"))
+
+
+class OrderPermissionTests(TestCase):
+    def test_orders_are_staff_only_and_read_only(self):
+        self.assertEqual(self.client.get(reverse("order-list")).status_code, 403)
+
+        user = User.objects.create_user("customer", password="secret")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("order-summary")).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get(reverse("order-list")).status_code, 200)
+        self.assertEqual(self.client.post(reverse("order-list"), {}).status_code, 405)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com", phone="5550100")
+        cards = Product.objects.create(name="Cards", category="Print", price=Decimal("2.50"), stock_quantity=10)
+        flyers = Product.objects.create(name="Flyers", category="Print", price=Decimal("0.40"), stock_quantity=10)
+
+        # Creates, a status change, an item update and deletes all go through the signals
+        orders = [Order.objects.create(customer=customer) for _ in range(3)]
+        for order in orders:
+            OrderItem.objects.create(order=order, product=cards, quantity=2, price=cards.price)
+            OrderItem.objects.create(order=order, product=flyers, quantity=5, price=flyers.price)
+        orders[0].status = "completed"
+        orders[0].save()
+        item = orders[1].items.get(product=cards)
+        item.quantity = 7
+        item.save()
+        orders[2].items.get(product=flyers).delete()
+        orders[2].delete()
+
+    def rollups(self):
+        return (
+            sorted(DailyOrderStats.objects.filter(order_count__gt=0).values_list("date", "status", "order_count")),
+            sorted(
+                DailyProductSales.objects.filter(quantity__gt=0)
+                .values_list("date", "product__name", "quantity", "revenue")
+            ),
+        )
+
+    def test_rebuild_matches_the_signal_maintained_rollups(self):
+        maintained = self.rollups()
+        self.assertEqual([row[1:] for row in maintained[0]], [("completed", 1), ("pending", 1)])
+        self.assertEqual(
+            [row[1:] for row in maintained[1]],
+            [("Cards", 9, Decimal("22.50")), ("Flyers", 10, Decimal("4.00"))]
+        )
+
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), maintained)
+
+    def test_orders_without_rollup_rows_can_change_and_be_deleted(self):
+        # As for orders created before the rollup tables existed
+        DailyOrderStats.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        order = Order.objects.first()
+        order.status = "cancelled"
+        order.save()
+        order.items.first().delete()
+        order.delete()
 
-# Create your tests here.
+        self.assertFalse(DailyOrderStats.objects.filter(status="completed").exclude(order_count=0).exists())
+        self.assertEqual(DailyOrderStats.objects.get(status="cancelled").order_count, 0)
+        self.assertFalse(DailyProductSales.objects.exclude(quantity=0, revenue=0).exists())
@@ -1,12 +1,53 @@
+from django.conf import settings
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Prefetch, Sum
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets
-from .models import Order
-from .serializers import OrderSerializer
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from .models import Order, OrderItem
+from .serializers import OrderSerializer, OrderSummarySerializer
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-created_at')
+class OrderPagination(CursorPagination):
+    """Newest orders first, paged by cursor on the created_at index instead of OFFSET."""
+    ordering = ('-created_at', '-id')
+    page_size = settings.ORDER_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ORDER_MAX_PAGE_SIZE
+
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """Orders with their customers' details: read-only, and for staff only."""
     serializer_class = OrderSerializer
+    pagination_class = OrderPagination
+    permission_classes = [IsAdminUser]
 
-    def perform_create(self, serializer):
-        # Assuming the authenticated user is placing the order:
-        serializer.save(requested_by=self.request.user)
+    def get_queryset(self):
+        # A page costs two queries whatever its size: orders joined with their
+        # customer and user, then all of the page's items with their products
+        items = OrderItem.objects.select_related('product')
+        return (
+            Order.objects
+            .select_related('customer', 'requested_by')
+            .prefetch_related(Prefetch('items', queryset=items))
+            .order_by('-created_at', '-id')
+        )
 
+    @action(detail=False, serializer_class=OrderSummarySerializer)
+    def summary(self, request, *args, **kwargs):
+        """
+        Flat order rows for dashboards that poll often: one query per page,
+        item count and total computed by the database.
+        """
+        line_total = ExpressionWrapper(
+            F('items__price') * F('items__quantity'),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+        queryset = (
+            Order.objects
+            .select_related('customer')
+            .annotate(item_count=Count('items'), total=Coalesce(Sum(line_total), 0, output_field=DecimalField()))
+            .order_by('-created_at', '-id')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,54 @@
+# Generated by Django 4.1 on 2026-10-18 12:05
+
+from django.db import migrations
+
+# SQLite: an FTS5 trigram table kept in sync with triggers, so bulk loads
+# are indexed too. PostgreSQL: pg_trgm GIN indexes on the columns themselves.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE products_product_fts USING fts5(name, description, tokenize='trigram')",
+    "INSERT INTO products_product_fts(rowid, name, description) SELECT id, name, description FROM products_product",
+    "CREATE TRIGGER products_product_fts_ai AFTER INSERT ON products_product BEGIN "
+    "INSERT INTO products_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER products_product_fts_ad AFTER DELETE ON products_product BEGIN "
+    "DELETE FROM products_product_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER products_product_fts_au AFTER UPDATE ON products_product BEGIN "
+    "UPDATE products_product_fts SET rowid = new.id, name = new.name, description = new.description "
+    "WHERE rowid = old.id; END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS products_product_fts_ai",
+    "DROP TRIGGER IF EXISTS products_product_fts_ad",
+    "DROP TRIGGER IF EXISTS products_product_fts_au",
+    "DROP TABLE IF EXISTS products_product_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON products_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS product_description_trgm_idx ON products_product USING gin (description gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS product_name_trgm_idx",
+    "DROP INDEX IF EXISTS product_description_trgm_idx",
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        # Other backends fall back to substring matching in chat.search
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRES_REVERSE}),
+        ),
+    ]
@@ -8,8 +8,29 @@ from chat.routing import websocket_urlpatterns
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storechat.settings")
 django.setup() 
 
+from chat.tokens import preload_encoding
+from chat.upstream import upstream_pool
+
+
+async def lifespan(scope, receive, send):
+    """
+    Server startup and shutdown: loads the tokenizer in the background, so no
+    chat turn waits for its download, and closes the pooled OpenAI sessions.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            preload_encoding()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await upstream_pool.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
 # Django ASGI application
 application = ProtocolTypeRouter({
+    "lifespan": lifespan,
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(  
         URLRouter(
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 
 import os
+import json
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,8 @@ DEBUG = True
 ALLOWED_HOSTS = ['*']
 CORS_ALLOWED_ORIGINS = ['http://localhost:3000']
 CORS_ALLOW_ALL_ORIGINS = True
+# Anonymous chat sessions are tied to the session cookie, so the frontend sends it
+CORS_ALLOW_CREDENTIALS = True
 
 
 # Application definition
@@ -88,13 +91,175 @@ WSGI_APPLICATION = 'storechat.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE picks the profile: "sqlite" (default) or "postgresql".
+# Connections are kept for DB_CONN_MAX_AGE seconds, so the thread pool behind
+# sync_to_async reuses them instead of reconnecting on every hop.
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+
+# SQLite is tuned on connect (see core/db.py): WAL so readers don't block
+# the writer, synchronous=NORMAL, a busy timeout instead of immediate
+# "database is locked" errors, and memory-mapped reads.
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("POSTGRES_DB", "storechat"),
+            'USER': os.getenv("POSTGRES_USER", "storechat"),
+            'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+            'HOST': os.getenv("POSTGRES_HOST", "localhost"),
+            'PORT': os.getenv("POSTGRES_PORT", "5432"),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Reused connections are checked first, so a restarted server isn't an error
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5"))},
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("SQLITE_PATH", BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {'timeout': SQLITE_BUSY_TIMEOUT},
+        }
+    }
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Registers the trigram lookups used by chat.search
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+REDIS_HOST = os.getenv("REDIS_HOST")
+REDIS_PORT = os.getenv("REDIS_PORT", "6379")
+
+if REDIS_HOST:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        }
+    }
+
+# Channel layer
+# Every socket of a chat session joins one group, so replies reach all of
+# them from whichever worker runs the turn. Redis spans workers and nodes;
+# the in-memory layer (tests, single process) only spans one process.
+CHANNEL_LAYER_CAPACITY = int(os.getenv("CHANNEL_LAYER_CAPACITY", "1000"))
+
+if REDIS_HOST:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [f'redis://{REDIS_HOST}:{REDIS_PORT}/0'],
+                'capacity': CHANNEL_LAYER_CAPACITY,
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': CHANNEL_LAYER_CAPACITY},
+        }
+    }
+
+# Result cache for LLM database lookups.
+# "memory" keeps results in each worker, "django" uses the cache above.
+# In-memory invalidation only reaches the worker that saw the write, so with
+# Redis available the shared cache is the default.
+LOOKUP_CACHE_BACKEND = os.getenv("LOOKUP_CACHE_BACKEND", "django" if REDIS_HOST else "memory")
+LOOKUP_CACHE_ALIAS = os.getenv("LOOKUP_CACHE_ALIAS", "default")
+LOOKUP_CACHE_MAX_ENTRIES = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "1024"))
+LOOKUP_CACHE_TTL = int(os.getenv("LOOKUP_CACHE_TTL", "60"))
+
+# Maximum rows an LLM lookup returns per model ("default" covers the rest),
+# and the point at which the reported total stops being counted exactly.
+LOOKUP_ROW_LIMITS = {
+    "default": int(os.getenv("LOOKUP_MAX_ROWS", "50")),
+    "OrderItem": 100,
+    "Product": 100,
+}
+LOOKUP_COUNT_CAP = int(os.getenv("LOOKUP_COUNT_CAP", "10000"))
+
+# Name and description searches ("search" in a lookup_spec) go through
+# trigram indexes: FTS5 on SQLite, pg_trgm on PostgreSQL. At most
+# SEARCH_CANDIDATES matches are kept; on SQLite a match must share
+# SEARCH_MIN_SIMILARITY of the search term's trigrams.
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.3"))
+
+# Chat history and session list pages (keyset paginated); clients may ask
+# for up to CHAT_MAX_PAGE_SIZE rows with ?page_size=
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))
+CHAT_MAX_PAGE_SIZE = int(os.getenv("CHAT_MAX_PAGE_SIZE", "200"))
+
+# Order API pages (cursor paginated, newest first)
+ORDER_PAGE_SIZE = int(os.getenv("ORDER_PAGE_SIZE", "50"))
+ORDER_MAX_PAGE_SIZE = int(os.getenv("ORDER_MAX_PAGE_SIZE", "200"))
+
+# Admin changelists count rows exactly up to this many, then show the
+# database's estimate (see core.paginator)
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv("ADMIN_EXACT_COUNT_LIMIT", "10000"))
+
+# OpenAI calls share one keep-alive HTTP session per worker. At most
+# OPENAI_MAX_CONCURRENCY calls run at once; each gives up after
+# OPENAI_REQUEST_TIMEOUT seconds. Set OPENAI_API_BASE to point at a stub server.
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+OPENAI_REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "30"))
+
+# Chat model, and its USD prices per 1K prompt / completion tokens used to
+# cost each assistant message. OPENAI_PRICES takes a JSON object of the same shape.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_PRICES = json.loads(os.getenv("OPENAI_PRICES", "null")) or {
+    "gpt-3.5-turbo": {"prompt": 0.0005, "completion": 0.0015},
+    "gpt-4o-mini": {"prompt": 0.00015, "completion": 0.0006},
+    "gpt-4o": {"prompt": 0.0025, "completion": 0.01},
 }
 
+# Answer common queries ("pending orders", "orders for John", "stock of X",
+# "orders since <date>") from templates without calling the LLM
+CHAT_FAST_PATH = os.getenv("CHAT_FAST_PATH", "True") == "True"
+
+# A chat turn runs at most CHAT_MAX_TOOL_STEPS rounds of lookups and stops
+# requesting more once CHAT_TURN_TIME_BUDGET seconds have passed.
+CHAT_MAX_TOOL_STEPS = int(os.getenv("CHAT_MAX_TOOL_STEPS", "3"))
+CHAT_TURN_TIME_BUDGET = float(os.getenv("CHAT_TURN_TIME_BUDGET", "20"))
+
+# Each socket answers one question at a time and holds at most
+# CHAT_QUEUE_SIZE more. When that's full, CHAT_QUEUE_OVERFLOW decides:
+# "reject" the new question, "drop_oldest" waiting one, or "replace"
+# (cancel the question in progress and everything waiting, keep the new one).
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "2"))
+CHAT_QUEUE_OVERFLOW = os.getenv("CHAT_QUEUE_OVERFLOW", "reject")
+
+# Prompt tokens a chat turn may use for system prompt, history and the new query
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+
+# Once a session's history window holds more than CHAT_SUMMARY_TRIGGER messages,
+# all but the newest CHAT_SUMMARY_KEEP_RECENT are folded into a rolling summary
+# of at most CHAT_SUMMARY_TOKEN_LIMIT tokens.
+CHAT_SUMMARY_TRIGGER = int(os.getenv("CHAT_SUMMARY_TRIGGER", "20"))
+CHAT_SUMMARY_KEEP_RECENT = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "10"))
+CHAT_SUMMARY_TOKEN_LIMIT = int(os.getenv("CHAT_SUMMARY_TOKEN_LIMIT", "400"))
+
+# Chat messages are written in batches: once this many are queued,
+# or this many seconds after the first one was queued.
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "50"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5"))
+# A message that still fails after this many flushes, or that the database
+# rejects outright, is appended to CHAT_DEAD_LETTER_PATH as a JSON line
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "5"))
+CHAT_DEAD_LETTER_PATH = os.getenv("CHAT_DEAD_LETTER_PATH", str(BASE_DIR / "chat_dead_letters.jsonl"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -139,3 +304,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Logging
+# chat.timing logs one line per timed stage of a chat turn at DEBUG;
+# set CHAT_LOG_LEVEL=DEBUG to see them. Timings are always exported on /metrics.
+CHAT_LOG_LEVEL = os.getenv("CHAT_LOG_LEVEL", "INFO")
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'chat': {'handlers': ['console'], 'level': CHAT_LOG_LEVEL},
+    },
+}
@@ -17,11 +17,14 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf.urls.static import static
 from django.conf import settings
+from chat.views import metrics_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/messages/', include("chat.urls")),
+    path('api/v1/orders/', include("orders.urls")),
+    path('metrics', metrics_view, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
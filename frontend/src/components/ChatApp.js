@@ -7,10 +7,12 @@ const ChatApp = () => {
   const [newSessionName, setNewSessionName] = useState("New Session");
 
   useEffect(() => {
-    fetch("http://localhost:8000/api/v1/messages/session/")
+    fetch("http://localhost:8000/api/v1/messages/session/?fields=id,session_id,title,created_at", {
+      credentials: "include",
+    })
       .then((response) => response.json())
       .then((data) => {
-        setSessions(data);
+        setSessions(data.results);
       })
       .catch((error) => {
         console.error("Error fetching sessions:", error);
@@ -22,6 +24,7 @@ const ChatApp = () => {
 
     fetch("http://localhost:8000/api/v1/messages/session/", {
       method: "POST",
+      credentials: "include",
       headers: {
         "Content-Type": "application/json",
       },
@@ -4,6 +4,7 @@ const ChatWindow = (props) => {
   const [messages, setMessages] = useState([]);
   const [sessionId, setSessionId] = useState(null);
   const [input, setInput] = useState("");
+  const [olderUrl, setOlderUrl] = useState(null);
   const ws = useRef(null);
   const messagesEndRef = useRef(null);
 
@@ -16,16 +17,30 @@ const ChatWindow = (props) => {
   const fetchMessages = async () => {
     try {
       const response = await fetch(
-        `http://localhost:8000/api/v1/messages/chat/?session_id=${sessionId}`
+        `http://localhost:8000/api/v1/messages/chat/?session_id=${sessionId}&fields=id,role,content`,
+        { credentials: "include" }
       );
       const data = await response.json();
-      setMessages(data.reverse());
+      setMessages(data.results.reverse());
+      setOlderUrl(data.next);
       scrollToBottom();
     } catch (err) {
       console.error("Failed to fetch messages:", err);
     }
   };
 
+  // Pages come newest first; earlier ones are prepended
+  const fetchOlderMessages = async () => {
+    try {
+      const response = await fetch(olderUrl, { credentials: "include" });
+      const data = await response.json();
+      setMessages((prev) => [...data.results.reverse(), ...prev]);
+      setOlderUrl(data.next);
+    } catch (err) {
+      console.error("Failed to fetch older messages:", err);
+    }
+  };
+
   // scroll to the bottom when new messages appear
   const scrollToBottom = () => {
     if (messagesEndRef.current) {
@@ -48,6 +63,31 @@ const ChatWindow = (props) => {
     ws.current.onmessage = (event) => {
       const data = JSON.parse(event.data);
 
+      if (data.type === "chat_message") {
+        // A question sent from another tab or device on this session
+        setMessages((prev) => [
+          ...prev,
+          { role: data.role, content: data.content },
+        ]);
+        scrollToBottom();
+      }
+
+      if (data.type === "chat_cancelled") {
+        // Drop the partial reply of a question that was stopped
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          return last && last.streaming ? prev.slice(0, -1) : prev;
+        });
+      }
+
+      if (data.type === "busy") {
+        setMessages((prev) => [
+          ...prev,
+          { role: "assistant", content: data.message },
+        ]);
+        scrollToBottom();
+      }
+
       if (data.type === "chat_response") {
         setMessages((prev) => [
           ...prev,
@@ -55,6 +95,34 @@ const ChatWindow = (props) => {
         ]);
         scrollToBottom();
       }
+
+      if (data.type === "chat_delta") {
+        // Append the token to the assistant message being streamed
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          if (last && last.role === "assistant" && last.streaming) {
+            return [
+              ...prev.slice(0, -1),
+              { ...last, content: last.content + data.delta },
+            ];
+          }
+          return [
+            ...prev,
+            { role: "assistant", content: data.delta, streaming: true },
+          ];
+        });
+        scrollToBottom();
+      }
+
+      if (data.type === "chat_done") {
+        // Replace the streamed text with the final reply
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          const rest = last && last.streaming ? prev.slice(0, -1) : prev;
+          return [...rest, { role: "assistant", content: data.reply }];
+        });
+        scrollToBottom();
+      }
     };
 
     ws.current.onerror = (error) => {
@@ -78,6 +146,7 @@ const ChatWindow = (props) => {
       const message = {
         query: input,
         session_id: sessionId,
+        stream: true,
       };
       ws.current.send(JSON.stringify(message));
       setMessages((prev) => [...prev, { role: "user", content: input }]);
@@ -109,6 +178,11 @@ const ChatWindow = (props) => {
       	</div>
 
       <div style={styles.messages}>
+        {olderUrl && (
+          <button style={styles.olderButton} onClick={fetchOlderMessages}>
+            Load earlier messages
+          </button>
+        )}
         {messages.map((msg, idx) => {
           const isUser = msg.role === "user";
           return (
@@ -165,6 +239,15 @@ const styles = {
     height: "100%",
     backgroundColor: "#fff",
   },
+  olderButton: {
+    display: "block",
+    margin: "0 auto 10px",
+    padding: "6px 12px",
+    border: "1px solid #ccc",
+    borderRadius: "4px",
+    backgroundColor: "#fff",
+    cursor: "pointer",
+  },
   header: {
     padding: "10px 20px",
     backgroundColor: "#f0f2f5",